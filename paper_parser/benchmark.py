@@ -0,0 +1,271 @@
+# -*- coding:utf-8 -*-
+
+
+import os
+import re
+import csv
+import html
+import glob
+import time
+import json
+import argparse
+import tempfile
+import tracemalloc
+import ujson
+from paper_parser import functions
+from paper_parser import models
+from paper_parser import parser
+
+
+# 基准测试：用仓库自带的样本文书（html压缩包和csv）还原文书json，不经数据库测量各环节的耗时
+# 用法：python -m paper_parser.benchmark [--source 压缩包或解压后的目录] [--save-baseline]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE = os.path.join(BASE_DIR, 'data', 'example_data_tanwuhuilu2(html-1000).7z')
+DEFAULT_CSV = os.path.join(BASE_DIR, 'example_data(1000).csv')
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'data', 'benchmark_baseline.json')
+
+PROVINCE_NAMES = {
+    11: '北京市', 12: '天津市', 13: '河北省', 14: '山西省', 15: '内蒙古自治区',
+    21: '辽宁省', 22: '吉林省', 23: '黑龙江省',
+    31: '上海市', 32: '江苏省', 33: '浙江省', 34: '安徽省', 35: '福建省', 36: '江西省', 37: '山东省',
+    41: '河南省', 42: '湖北省', 43: '湖南省', 44: '广东省', 45: '广西壮族自治区', 46: '海南省',
+    50: '重庆市', 51: '四川省', 52: '贵州省', 53: '云南省', 54: '西藏自治区',
+    61: '陕西省', 62: '甘肃省', 63: '青海省', 64: '宁夏回族自治区', 65: '新疆维吾尔自治区'
+}
+COURT_LEVEL_NAMES = {'1': '基层法院', '2': '中级法院', '3': '高级法院', '4': '最高法院', '9': '专门法院'}
+# 段落的标签类型 -> json中对应的全文字段
+PARAGRAPH_KEYS = {
+    1: 'all_text_litigantinfo', 2: 'firstinstance_text_basicinfo', 6: 'firstinstance_text_fact',
+    7: 'firstinstance_text_opinion', 8: 'firstinstance_text_judgement',
+}
+
+
+def read_pages(source):
+    """ 读取样本html，返回{paper_id: html字符串}。source为7z压缩包（需另行安装py7zr）或已解压的目录 """
+    if not os.path.isdir(source):
+        try:
+            import py7zr
+        except ImportError:
+            raise ImportError('reading the 7z sample needs py7zr (pip install py7zr), or pass an extracted directory')
+        with tempfile.TemporaryDirectory() as extract_dir:
+            with py7zr.SevenZipFile(source, 'r') as archive:
+                archive.extractall(path=extract_dir)
+            return read_pages(extract_dir)
+    pages = {}
+    for page_path in glob.glob(os.path.join(source, '**', '*.html'), recursive=True):
+        paper_id = os.path.basename(page_path)[:-len('.html')]
+        if paper_id.isdigit():
+            with open(page_path, encoding='utf-8') as f:
+                pages[int(paper_id)] = f.read()
+    return pages  # dict{int: str}
+
+
+def read_csv_rows(csv_path):
+    """ 读取样本csv，返回{paper_id: 行字典} """
+    with open(csv_path, encoding='gbk', newline='') as f:
+        return dict((int(row['paper_id']), row) for row in csv.DictReader(f))  # dict{int: dict}
+
+
+def page_to_json(paper_id, page, row):
+    """ 由样本html（段落正文）和csv（元数据）还原文书json，返回dict。字段与数据库中的paper_content一致 """
+    def value(key):
+        item = row.get(key)
+        return None if item in (None, '', 'None') else item
+
+    def later(key):  # region、city在json中不含省份
+        item = value(key)
+        if item and province and item.startswith(province):
+            return item[len(province):]
+        return item
+
+    heads = re.findall(r'<p>(.*?)</p>', page.split('<body>\n', 1)[1], re.S)
+    jid, _, cause = heads[0].partition(' ')
+    title, case_number, court = heads[1:4]
+    cause = None if cause in ('', 'None') else cause
+    case_number = None if case_number in ('', 'None') else case_number
+    paragraphs = []
+    rest = heads[4:-2]  # 去掉页脚
+    for i in range(0, len(rest) - 1, 2):
+        match = re.match(r'(\d+)\.(.*)', rest[i])
+        if not match:
+            break
+        text = html.unescape(rest[i + 1])
+        sentences = [{'length': len(s) + 1, 'text': s + '。'} for s in text.split('。') if s]
+        paragraphs.append({
+            'labelType': int(match.group(1)), 'lableName': match.group(2), 'length': len(text), 'text': text,
+            'subParagraphs': [{'sentences': sentences}],
+        })
+    province = PROVINCE_NAMES.get(int(value('province'))) if value('province') else None
+    paper_json = {
+        'jid': jid.lower(), 'type': int(value('paper_type') or 1),
+        'all_caseinfo_casenumber': case_number, 'all_caseinfo_casename': title,
+        'level1_case': '刑事', 'level2_case': '贪污贿赂罪', 'level3_case': cause,
+        'level4_case': None, 'level5_case': None,
+        'all_text_cause': cause, 'all_caseinfo_court': court,
+        'court_level': COURT_LEVEL_NAMES.get(row.get('court_level')),
+        'all_caseinfo_leveloftria': int(value('trial_level') or 1),
+        'province': province, 'region': later('region'), 'city': later('city'),
+        'accept_date': value('accept_date'), 'all_judgementinfo_date': value('judge_date'),
+        'all_chief_judge': value('chief_judge'),
+        'all_judges': value('judges').split('+') if value('judges') else None,
+        'all_people_jury': ';'.join(value('jurors').split('+')) if value('jurors') else None,
+        'all_clerk': value('clerk'),
+        'all_litigant': value('defendant_name').split('+') if value('defendant_name') else [],
+        'law_regu_details': [{
+            'lawName': '《中华人民共和国刑法（{}修正）》'.format(value('crime_law_version')), 'tiaoName': '第三百八十五条'
+        }] if value('crime_law_version') else [],
+        'paragraphs': paragraphs,
+        'lawyer_term': value('lawyers').split('+') if value('lawyers') else [],
+        'lawfirm_term': value('lawyer_firms').split('+') if value('lawyer_firms') else [],
+        'evidence': None,
+        'prosecution_organ_term': [value('prosecution')] if value('prosecution') else [],
+        'acceptance_fee': '0',
+    }
+    for key in PARAGRAPH_KEYS.values():
+        paper_json[key] = None
+    for para in paragraphs:
+        if para['labelType'] in PARAGRAPH_KEYS:
+            paper_json[PARAGRAPH_KEYS[para['labelType']]] = para['text']
+    return paper_json  # dict
+
+
+def load_corpus(source=DEFAULT_SOURCE, csv_path=DEFAULT_CSV):
+    """ 还原样本语料，返回按id排列的(row_id, 编码的paper_content)列表，与数据库读出的行相同 """
+    pages = read_pages(source)
+    csv_rows = read_csv_rows(csv_path)
+    rows = []
+    for paper_id in sorted(pages):
+        paper_json = page_to_json(paper_id, pages[paper_id], csv_rows.get(paper_id, {}))
+        rows.append((paper_id, functions.PaperContentCoder.encode(ujson.dumps(paper_json, ensure_ascii=False))))
+    return rows  # list[tuple(int, str), ]
+
+
+def timed(func, items):
+    """ 对items中的每一项调用func，返回总秒数 """
+    start_time = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - start_time  # float
+
+
+def clean_paragraphs(paper_json):
+    for para in paper_json['paragraphs']:
+        functions.TextProcessor(para['text']).clean_text
+
+
+def run(rows, repeat=3):
+    """ 测量各环节，每个环节取repeat次中最快的一次。返回报告dict，耗时的单位为微秒/篇 """
+    num = len(rows)
+    csv_writer = functions.Csv(os.devnull, tuple(column for column, attr, key in parser.EXPORT_COLUMNS))
+    decoded = [functions.PaperContentCoder.decode_bytes(content) for row_id, content in rows]
+    jsons = [(row_id, ujson.loads(content)) for (row_id, encoded), content in zip(rows, decoded)]
+    jsons = [(row_id, paper_json) for row_id, paper_json in jsons if paper_json is not None]
+
+    def encode_row(values):
+        try:
+            csv_writer.encode_row(values)
+        except UnicodeEncodeError:
+            pass
+
+    stages = {
+        'decode': lambda: timed(lambda row: functions.PaperContentCoder.decode_bytes(row[1]), rows),
+        'json_parse': lambda: timed(ujson.loads, decoded),
+        'clean_text': lambda: timed(lambda item: clean_paragraphs(item[1]), jsons),
+        'csv_format': lambda: timed(encode_row, values_list),
+        'html_render': lambda: timed(lambda item: models.TanwuhuiluPaper(*item).render_html(), jsons),
+        'end_to_end': lambda: timed(lambda row: list(parser.parse_rows([row])), rows),
+    }
+    values_list = list(parser.parse_rows(rows))
+    report = {'papers': num, 'stages': {}, 'features': {}, 'shared': {}}
+    for stage, measure in stages.items():
+        report['stages'][stage] = round(min(measure() for i in range(repeat)) / num * 1e6, 2)
+    report['papers_per_sec'] = round(1e6 / report['stages']['end_to_end'], 1)
+
+    # 逐个要素计时：每次在新建的文书对象上取值，计入该要素及其全部依赖（含共用的清洗文本、段落索引）的耗时
+    # 共用的中间结果（被其他要素依赖的要素）另列为shared，其中文本处理器计入clean_text的耗时，便于看出共用部分的成本
+    # 因此features中各项有重叠，不能相加；单个要素自身的耗时约为其features值减去所依赖的shared值
+    dependents = models.TanwuhuiluPaper.feature_dependents()
+    names = [name for name in models.TanwuhuiluPaper.feature_versions() if name != 'json']
+    shared = [name for name in names if dependents.get(name)]
+
+    def cold(name, force_clean_text=False):
+        elapsed = 0.0
+        for row_id, paper_json in jsons:
+            paper = models.TanwuhuiluPaper(row_id, paper_json)
+            paper.json  # 文书json的解析已计入json_parse环节
+            start_time = time.perf_counter()
+            value = getattr(paper, name)
+            if force_clean_text and isinstance(value, functions.TextProcessor):
+                value.clean_text
+            elapsed += time.perf_counter() - start_time
+        return elapsed
+
+    for group, group_names, force_clean_text in (('features', names, False), ('shared', shared, True)):
+        for name in group_names:
+            best = min(cold(name, force_clean_text) for i in range(repeat))
+            report[group][name] = round(best / num * 1e6, 2)
+
+    tracemalloc.start()
+    list(parser.parse_rows(rows))
+    report['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    tracemalloc.stop()
+    return report  # dict
+
+
+def compare(report, baseline, tolerance=0.25, min_delta=5.0):
+    """ 与基准比较，返回变慢超过tolerance（比例）且超过min_delta微秒/篇的项[(项目, 基准值, 当前值), ] """
+    """ min_delta用于忽略耗时很短的要素的计时波动 """
+    regressions = []
+    for group in ('stages', 'features', 'shared'):
+        for name, value in report[group].items():
+            base_value = baseline.get(group, {}).get(name)
+            if base_value and value > base_value * (1 + tolerance) and value - base_value > min_delta:
+                regressions.append(('{0}.{1}'.format(group, name), base_value, value))
+    base_value = baseline.get('peak_memory_mb')
+    if base_value and report['peak_memory_mb'] > base_value * (1 + tolerance):
+        regressions.append(('peak_memory_mb', base_value, report['peak_memory_mb']))
+    return regressions  # list[tuple(str, float, float), ]
+
+
+def print_report(report, regressions=None):
+    print('papers: {0}  papers/sec: {1}  peak memory: {2} MB'.format(
+        report['papers'], report['papers_per_sec'], report['peak_memory_mb']
+    ))
+    for group in ('stages', 'features', 'shared'):
+        print('{} (us/paper):'.format(group))
+        for name, value in sorted(report[group].items(), key=lambda item: -item[1]):
+            print('    {0:<36}{1:>12.2f}'.format(name, value))
+    if regressions is not None:
+        if regressions:
+            print('regressions:')
+            for name, base_value, value in regressions:
+                print('    {0:<36}{1:>12.2f} -> {2:.2f}'.format(name, base_value, value))
+        else:
+            print('no regressions against baseline')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Benchmark paper parsing on the bundled sample corpus.')
+    arg_parser.add_argument('--source', default=DEFAULT_SOURCE, help='7z archive or extracted directory of html pages')
+    arg_parser.add_argument('--csv', default=DEFAULT_CSV, help='csv with the metadata of the sample')
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline json to compare against')
+    arg_parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    arg_parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown ratio, default 0.25')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='runs per stage, the fastest is kept')
+    args = arg_parser.parse_args(argv)
+
+    report = run(load_corpus(args.source, args.csv), args.repeat)
+    regressions = None
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+    print_report(report, regressions)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
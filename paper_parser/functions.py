@@ -7,33 +7,150 @@ import zlib
 import base64
 from paper_parser import settings
 import re
+import os
+import time
+import sqlite3
+import json
+import io
+import zipfile
+import tarfile
+import queue
+import threading
+import gzip
+import glob
 from datetime import datetime
+from collections import OrderedDict
+from functools import lru_cache
+import jieba
 import jieba.posseg as pseg
+import hashlib
+from multiprocessing import Pool
 import numpy as np
+try:
+    from re import _parser as sre_parse  # Python 3.11起sre_parse移入re包
+except ImportError:
+    import sre_parse
 
 
-class MysqlConnector:
+class ConnectionPool:
+    """ 数据库连接池，每个用户id一个。空闲连接复用，超过ping_interval秒未用的连接在取出前检查并按需重连 """
+    """ 连接数达到size时，取连接须等待其他线程归还 """
 
-    def __init__(self, user_id=1):  # 传入用户id，0-root权限 1-读取权限，默认1
-        self.db = pymysql.connect(
+    def __init__(self, user_id, size=None, ping_interval=None):
+        self.user_id = user_id
+        self.size = size or settings.MysqlParameter.pool_size
+        self.ping_interval = settings.MysqlParameter.pool_ping_interval if ping_interval is None else ping_interval
+        self.pid = os.getpid()  # 创建连接池的进程；fork出的子进程不能共用父进程的连接
+        self.idle = []  # 空闲连接及其归还时间[(连接, 时间), ]
+        self.opened = 0  # 已打开的连接数
+        self.condition = threading.Condition()
+
+    def connect(self):
+        return pymysql.connect(
             host=settings.MysqlParameter.host, port=settings.MysqlParameter.port,
-            user=settings.MysqlParameter.users[user_id], passwd=settings.MysqlParameter.passwds[user_id],
+            user=settings.MysqlParameter.users[self.user_id], passwd=settings.MysqlParameter.passwds[self.user_id],
             db=settings.MysqlParameter.database, charset=settings.MysqlParameter.charset
         )
+
+    def acquire(self):
+        """ 取出一个可用的连接 """
+        with self.condition:
+            while not self.idle and self.opened >= self.size:
+                self.condition.wait()
+            if self.idle:
+                db, released_time = self.idle.pop()
+            else:
+                db, released_time = None, None
+                self.opened += 1
+        try:
+            if db is None:
+                db = self.connect()
+            elif time.monotonic() - released_time >= self.ping_interval:
+                db.ping(reconnect=True)  # 健康检查，断开的连接自动重连
+        except Exception:
+            self.discard(db)
+            raise
+        return db
+
+    def release(self, db):
+        """ 归还连接。先结束未提交的事务，避免下次使用时读到旧的快照；连接已失效时丢弃 """
+        try:
+            db.rollback()
+        except Exception:
+            self.discard(db)
+            return
+        with self.condition:
+            self.idle.append((db, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, db=None):
+        """ 丢弃一个连接，空出连接数 """
+        if db is not None:
+            try:
+                db.close()
+            except Exception:
+                pass
+        with self.condition:
+            self.opened -= 1
+            self.condition.notify()
+
+    def close(self):
+        """ 关闭全部空闲连接 """
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for db, released_time in idle:
+            self.discard(db)
+
+
+_pools = {}  # 各用户id的连接池{user_id: ConnectionPool}
+_pools_lock = threading.Lock()
+
+
+def get_pool(user_id):
+    """ 返回当前进程中该用户id的连接池；fork后的子进程中重新创建，不复用父进程的连接 """
+    with _pools_lock:
+        pool = _pools.get(user_id)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[user_id] = ConnectionPool(user_id)
+        return pool  # ConnectionPool
+
+
+class MysqlConnector:
+    """ 上下文管理器 """
+    """ 从连接池取出连接，退出时归还。root（user_id 0）与只读用户（user_id 1）各用一个连接池 """
+
+    def __init__(self, user_id=1):  # 传入用户id，0-root权限 1-读取权限，默认1
+        self.pool = get_pool(user_id)
+        self.db = self.pool.acquire()
         self.cursor = self.db.cursor()
+        self._max_id = None
 
     def __enter__(self):
-        max_id_sql = 'select max(id) from {}'.format(settings.MysqlParameter.used_table)
-        self.cursor.execute(max_id_sql)
-        self.max_id = int(self.cursor.fetchone()[0])
         return self
 
+    @property
+    def max_id(self):
+        """ 表中的最大id，首次使用时才查询 """
+        if self._max_id is None:
+            max_id_sql = 'select max(id) from {}'.format(settings.MysqlParameter.used_table)
+            self.cursor.execute(max_id_sql)
+            self._max_id = int(self.cursor.fetchone()[0])
+        return self._max_id  # int
+
+    def ss_cursor(self):
+        """ 服务器端游标，逐行读取结果集而不一次性载入内存。须读完结果集后才能在该连接上执行其他语句 """
+        return self.db.cursor(pymysql.cursors.SSCursor)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.cursor.close()
-        self.db.close()
+        if exc_type is None:
+            self.pool.release(self.db)
+        else:  # 出错时连接状态不确定（如结果集未读完），不再复用
+            self.pool.discard(self.db)
 
 
 class PaperContentCoder:
+    """ 文书内容的编解码。编码后的内容为zlib压缩后的base64字符串；str和bytes均可直接传入，无需先转换 """
 
     @staticmethod
     def check_json(json_str):
@@ -44,145 +161,307 @@ class PaperContentCoder:
             is_json = False
         return is_json
 
+    @staticmethod
+    def loads(json_str):
+        """ 解析json，返回解析结果；不是合法json时返回None。json_str可为str或bytes """
+        try:
+            json_obj = ujson.loads(json_str)
+        except ValueError:
+            json_obj = None
+        return json_obj
+
     @classmethod
     def encode(cls, json_str):
-        """ json_str -> bs64_str """
-        if cls.check_json(json_str):
-            json_encoded = base64.b64encode(zlib.compress(json_str.encode())).decode()
+        """ json_str -> bs64_str。校验只解析一次；json_str可为str或bytes """
+        json_bytes = json_str if isinstance(json_str, bytes) else json_str.encode()
+        if cls.check_json(json_bytes):
+            json_encoded = base64.b64encode(zlib.compress(json_bytes)).decode()
         else:
             json_encoded = None
         return json_encoded
 
+    @staticmethod
+    def decode_bytes(bs64_str):
+        """ bs64_str -> json_bytes。只解压，不校验；bs64_str可为str或bytes """
+        return zlib.decompress(base64.b64decode(bs64_str))  # bytes
+
     @classmethod
     def decode(cls, bs64_str):
         """ bs64_str -> json_str """
-        json_decoded = zlib.decompress(base64.b64decode(bs64_str.encode())).decode()
+        json_decoded = cls.decode_bytes(bs64_str).decode()
         if not cls.check_json(json_decoded):
             json_decoded = None
         return json_decoded
 
+    @staticmethod
+    def is_raw(paper_content):
+        """ 是否为未编码的json（文本或已解析的对象）。base64字符中没有'{'，可据首字符区分 """
+        if isinstance(paper_content, dict):
+            return True
+        return paper_content[:1] in ('{', b'{')  # bool
+
+    @classmethod
+    def decode_json(cls, bs64_str):
+        """ bs64_str -> json对象。一次解压加一次解析，直接返回校验时的解析结果；不是合法json时返回None """
+        """ 也接受未编码的json文本或已解析的对象（如快照文件中的内容），直接解析或原样返回 """
+        if cls.is_raw(bs64_str):
+            return bs64_str if isinstance(bs64_str, dict) else cls.loads(bs64_str)  # dict
+        return cls.loads(cls.decode_bytes(bs64_str))  # dict
+
+    @classmethod
+    def decode_json_batch(cls, rows):
+        """ 批量解码数据行(row_id, bs64_str)，返回(row_id, json对象)的列表。不是合法json的行被跳过 """
+        decoded = []
+        for row_id, bs64_str in rows:
+            json_obj = cls.decode_json(bs64_str)
+            if json_obj is not None:
+                decoded.append((row_id, json_obj))
+        return decoded  # list[tuple(int, dict), ]
+
 
 class TagAlter:
     """ 以root用户登录数据库，批量调整tag值 """
-    def __init__(self, alter_ids, tag_value):
-        self.alter_ids = alter_ids  # 需要修改的row_id list[int, ]
+    """ 每chunk_size行合并为一条update语句，每块提交一次；只更新tag不同的行，各方法返回{'requested': 请求修改的行数, 'changed': 实际修改的行数} """
+    def __init__(self, alter_ids, tag_value, chunk_size=1000):
+        self.alter_ids = alter_ids  # 需要修改的row_id，可迭代对象 list[int, ]、set、range等；按条件修改时可为None
         self.tag = tag_value  # 修改后的tag值 int
+        self.chunk_size = chunk_size  # 每条语句、每次提交包含的行数
+        self.progress = Progress('tag alter: {} rows changed', every=100000, interval=5.0)
 
     def alter(self):
+        """ 修改alter_ids中各行的tag。alter_ids为步长1的range时按id区间修改，无需逐个列出id """
+        if isinstance(self.alter_ids, range) and self.alter_ids.step == 1:
+            return self.alter_range(self.alter_ids.start, self.alter_ids.stop - 1)
+        alter_ids = sorted(set(self.alter_ids))
+        changed = 0
         with MysqlConnector(0) as mc:
-            update_sql = 'update {0} set tag = {1} where id={{}}'.format(settings.MysqlParameter.used_table, self.tag)
-            for row_id in self.alter_ids:
-                mc.cursor.execute(update_sql.format(row_id))
+            for start_pos in range(0, len(alter_ids), self.chunk_size):
+                chunk = alter_ids[start_pos: start_pos + self.chunk_size]
+                update_sql = 'update {0} set tag = %s where id in ({1}) and not (tag <=> %s)'.format(
+                    settings.MysqlParameter.used_table, ','.join(['%s'] * len(chunk))
+                )
+                changed += mc.cursor.execute(update_sql, [self.tag] + chunk + [self.tag])
                 mc.db.commit()
-                print('row_id {} has changed tag to {}'.format(row_id, self.tag))
-        return 0
+                self.progress.update(changed)
+        return self.summary(len(alter_ids), changed)
+
+    def alter_range(self, start_id, end_id):
+        """ 修改 start_id <= id <= end_id 的各行的tag """
+        return self.alter_where(None, (), start_id, end_id)
+
+    def alter_where(self, condition, args=(), start_id=None, end_id=None):
+        """ 修改满足条件的各行的tag，条件为sql表达式，如 alter_where('cause = %s', ('受贿罪', )) """
+        """ 在id区间上分块执行，默认从1到最大id """
+        changed = 0
+        with MysqlConnector(0) as mc:
+            start_id = 1 if start_id is None else start_id
+            end_id = mc.max_id if end_id is None else end_id
+            update_sql = 'update {0} set tag = %s where id >= %s and id < %s and not (tag <=> %s)'.format(
+                settings.MysqlParameter.used_table
+            )
+            if condition:
+                update_sql += ' and ({})'.format(condition)
+            for chunk_start in range(start_id, end_id + 1, self.chunk_size):
+                chunk_end = min(chunk_start + self.chunk_size, end_id + 1)
+                changed += mc.cursor.execute(update_sql, [self.tag, chunk_start, chunk_end, self.tag] + list(args))
+                mc.db.commit()
+                self.progress.update(changed)
+        return self.summary(None if condition else max(end_id - start_id + 1, 0), changed)
+
+    def summary(self, requested, changed):
+        """ 打印并返回修改结果 """
+        if requested is None:  # 按条件修改时，请求的行数未知
+            print('tag alter: {} rows changed to tag {}'.format(changed, self.tag))
+        else:
+            print('tag alter: {} rows requested, {} rows changed to tag {}'.format(requested, changed, self.tag))
+        return {'requested': requested, 'changed': changed}  # dict
+
+
+MONEY_TABLE = str.maketrans({'余': None, '元': None, ',': None})
+
+
+@lru_cache(maxsize=65536)
+def money2num(money_str):
+    """ 输入金额str（带'元'字），返回float（以万元为单位）。同样的金额字符串在语料中大量重复，结果按字符串缓存 """
+    money_str = money_str.translate(MONEY_TABLE)  # 消除'余元,'
+    result = None
+    # 参数检查
+    if money_str.count('.') > 1:
+        return result
+    # 分类处理 纯汉字：一万三千(kind_tag=0) 或者 纯阿拉伯，阿拉伯数字+汉字：1.3万(kind_tag=1)
+    kind_tag = 0
+    for char in money_str:
+        if char in '0123456789':
+            kind_tag = 1
+            break
+    # 纯汉字：一万三千
+    if kind_tag == 0:
+        res, tmp, hnd_mln = 0, 0, 0
+        for curr_char in money_str:
+            curr_digit = settings.MONEY_NUM_MAP[curr_char]
+            # 处理亿
+            if curr_digit == 10 ** 8:
+                res = res + tmp
+                res = res * curr_digit
+                hnd_mln = hnd_mln * 10 ** 8 + res
+                res = 0
+                tmp = 0
+            # 处理万
+            elif curr_digit == 10 ** 4:
+                res = res + tmp
+                res = res * curr_digit
+                tmp = 0
+            # 处理千、百、十
+            elif curr_digit >= 10:
+                tmp = 1 if tmp == 0 else tmp
+                res = res + curr_digit * tmp
+                tmp = 0
+            # 处理单独数字
+            else:
+                tmp = tmp * 10 + curr_digit
+        res = res + tmp
+        result = float(res + hnd_mln)
+    # 阿拉伯数字+汉字：1.3万
+    elif kind_tag == 1:
+        if '万' in money_str:
+            result = float(money_str[:-1]) * (10 ** 4)
+        elif '亿' in money_str:
+            result = float(money_str[:-1]) * (10 ** 8)
+        else:
+            result = float(money_str)
+    result = result / 10000 if result else None
+    return result  # float 以万元为单位
+
+
+@lru_cache(maxsize=65536)
+def parse_date(date_string):
+    """ 'YYYY-MM-DD'形式的日期str -> datetime，与datetime.strptime(date_string, '%Y-%m-%d')的结果相同 """
+    """ 由正则的分组直接转为整数，不经strptime；其他形式仍交给strptime，出错时同样抛出ValueError。结果按字符串缓存 """
+    match = settings.pattern_iso_date.fullmatch(date_string)
+    if match:
+        return datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))  # datetime类
+    return datetime.strptime(date_string, '%Y-%m-%d')  # datetime类
+
+
+def parse_dates(dates):
+    """ 批量转换日期，返回numpy的datetime64[D]数组，用于全语料的审理时长、年龄等统计 """
+    """ dates的元素可为'YYYY-MM-DD'形式的str、datetime或None；None、空字符串和无法解析的日期转为NaT """
+    days = []
+    for date in dates:
+        if date and not isinstance(date, datetime):
+            try:
+                date = parse_date(date)
+            except ValueError:
+                date = None
+        days.append(date.date() if date else None)
+    return np.array(days, dtype='datetime64[D]')  # ndarray
+
+
+def money_matches(text):
+    """ 返回文本中金额的(金额字符串, 起始位置, 结束位置)列表，与settings.pattern_money.finditer的结果相同 """
+    """ 金额都以'元'结尾，在倒序的文本中用pattern_money_reversed从'元'开始匹配，正则可按字面量快速定位 """
+    if '元' not in text:
+        return []  # list
+    length = len(text)
+    matches = [
+        (match.group()[::-1], length - match.end(), length - match.start())
+        for match in settings.pattern_money_reversed.finditer(text[::-1])
+    ]
+    matches.reverse()
+    return matches  # list[tuple(str, int, int), ]
 
 
 class TextProcessor:
     """ 文本处理器，包含各种文本处理函数 """
     PUNCS = r""",.?!:;()"'-，。？！：；（）“”‘’《》、"""
     NUMS = '0123456789'
+    # 以下转换表只在导入时构建一次
+    CLEAN_TABLE = {
+        **str.maketrans(":;()", "：；（）", "\'\"/\\"),  # 英文标点转中文标点，并删除斜杠、反斜杠、英文单双引号
+        **str.maketrans("０１２３４５６７８９", "0123456789"),  # 中文全角数字转英文半角数字
+        ord('\n'): '    ',  # 所有换行符替换为4个空格
+    }
+    PUNCS_TABLE = str.maketrans('', '', PUNCS)
+    CLEAN_VERSION = 1  # 修改clean_text的清洗逻辑时递增，依赖清洗结果的输出（见Paper.render_version）随之失效
 
     def __init__(self, text):
         self.text = text
 
     @property
-    def clean_text(self):
-        """ 文本内容清洗 """
-        clean_text = ''
+    def text(self):
+        return self._text  # str
+
+    @text.setter
+    def text(self, text):
+        """ 更换文本时，同时丢弃已缓存的清洗结果和分句结果 """
+        self._text = text
+        self._clean_text = None
+        self._sentences = None
+
+    @property
+    def normalized_text(self):
+        """ 换行符、标点和全角数字在一次translate中完成转换，不删除括号内容（法条版本等写在括号中） """
+        normalized_text = ''
         if self.text:
-            clean_text = self.text.strip()
-            clean_text = clean_text.replace('\n', '    ')  # 所有换行符替换为4个空格
-            clean_text = clean_text.translate(
-                str.maketrans(":;()", "：；（）", "\'\"/\\")
-            )  # 英文标点转中文标点，并删除斜杠、反斜杠、英文单双引号
-            clean_text = clean_text.translate(
-                str.maketrans("０１２３４５６７８９", "0123456789")
-            )  # 中文全角数字转英文半角数字
-            clean_text = settings.pattern_delete_bracket_contents.sub('', clean_text)  # 删除括号和括号里面的内容
-        return clean_text  # str
+            normalized_text = self.text.strip().translate(self.CLEAN_TABLE)
+        return normalized_text  # str
+
+    @property
+    def clean_text(self):
+        """ 文本内容清洗。在normalized_text的基础上删除括号内容，结果在实例中缓存 """
+        if self._clean_text is None:
+            clean_text = ''
+            if self.text:
+                clean_text = settings.pattern_delete_bracket_contents.sub('', self.normalized_text)  # 删除括号和括号里面的内容
+            self._clean_text = clean_text
+        return self._clean_text  # str
 
     @property
     def without_puncs_text(self):
         """ 删除标点符号 """
         without_puncs_text = ''
         if self.clean_text:
-            without_puncs_text = self.clean_text.translate(str.maketrans('', '', self.PUNCS))
+            without_puncs_text = self.clean_text.translate(self.PUNCS_TABLE)
         return without_puncs_text  # str
 
-    def __money2num(self, money_str):
-        """ 输入金额str（带'元'字），返回float（以万元为单位） """
-        money_str = money_str.translate(str.maketrans({'余': None, '元': None, ',': None}))  # 消除'余元,'
-        result = None
-        # 参数检查
-        if money_str.count('.') > 1:
-            return result
-        # 分类处理 纯汉字：一万三千(kind_tag=0) 或者 纯阿拉伯，阿拉伯数字+汉字：1.3万(kind_tag=1)
-        kind_tag = 0
-        for char in money_str:
-            if char in self.NUMS:
-                kind_tag = 1
-                break
-        # 纯汉字：一万三千
-        if kind_tag == 0:
-            res, tmp, hnd_mln = 0, 0, 0
-            for curr_char in money_str:
-                curr_digit = settings.MONEY_NUM_MAP[curr_char]
-                # 处理亿
-                if curr_digit == 10 ** 8:
-                    res = res + tmp
-                    res = res * curr_digit
-                    hnd_mln = hnd_mln * 10 ** 8 + res
-                    res = 0
-                    tmp = 0
-                # 处理万
-                elif curr_digit == 10 ** 4:
-                    res = res + tmp
-                    res = res * curr_digit
-                    tmp = 0
-                # 处理千、百、十
-                elif curr_digit >= 10:
-                    tmp = 1 if tmp == 0 else tmp
-                    res = res + curr_digit * tmp
-                    tmp = 0
-                # 处理单独数字
-                else:
-                    tmp = tmp * 10 + curr_digit
-            res = res + tmp
-            result = float(res + hnd_mln)
-        # 阿拉伯数字+汉字：1.3万
-        elif kind_tag == 1:
-            if '万' in money_str:
-                result = float(money_str[:-1]) * (10 ** 4)
-            elif '亿' in money_str:
-                result = float(money_str[:-1]) * (10 ** 8)
-            else:
-                result = float(money_str)
-        result = result / 10000 if result else None
-        return result  # float 以万元为单位
-
     def extract_moneys(self):
         """ 提取文本中的金额，返回含浮点数的元组或空元组。以万元为单位。 """
         moneys = []
         text = self.clean_text.replace('，', ',').replace('。', '.')  # 中文逗号、句号暂时全部转为英文
-        money_strings = settings.pattern_money.findall(text)
-        if money_strings:
-            for m in money_strings:
-                r = self.__money2num(m)
-                if r is not None:
-                    moneys.append(r)
+        for m, start, end in money_matches(text):
+            r = money2num(m)
+            if r is not None:
+                moneys.append(r)
         return tuple(moneys)  # tuple(float, )
 
+    @classmethod
+    def extract_moneys_batch(cls, texts):
+        """ 批量提取多段文本中的金额（以万元为单位），返回三元组(amounts, spans, offsets)，均为numpy数组 """
+        """ amounts[offsets[i]:offsets[i + 1]]为第i段文本的金额，与extract_moneys的结果相同 """
+        """ spans为各金额在该段文本清洗后（clean_text）的起止位置，形状为(金额数, 2) """
+        amounts, spans, offsets = [], [], [0]
+        for text in texts:
+            text = cls(text).clean_text.replace('，', ',').replace('。', '.')
+            for money_str, start, end in money_matches(text):
+                amount = money2num(money_str)
+                if amount is not None:
+                    amounts.append(amount)
+                    spans.append((start, end))
+            offsets.append(len(amounts))
+        return (
+            np.array(amounts, dtype='float64'),
+            np.array(spans, dtype='int64').reshape(-1, 2),
+            np.array(offsets, dtype='int64'),
+        )  # tuple(ndarray, ndarray, ndarray)
+
     def extract_dates(self):
         """ 提取文本中的日期，形如XXXX年X月XX日，返回含datetime对象的元组或空元组 """
         dates = []
-        date_strings = settings.pattern_date.findall(self.clean_text)
-        if date_strings:
-            for d in date_strings:
-                try:
-                    dates.append(datetime.strptime(d, '%Y年%m月%d日'))
-                except ValueError:
-                    pass
+        for match in settings.pattern_date.finditer(self.clean_text):
+            try:
+                dates.append(datetime(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+            except ValueError:  # 不存在的日期，如2月30日
+                pass
         return tuple(dates)  # tuple(datetime, )
 
     def check_exist(self, target):
@@ -200,12 +479,18 @@ class TextProcessor:
         seg_list = pseg.cut(self.clean_text)
         return seg_list  # iterator
 
+    @property
+    def word_flags(self):
+        """ 分词和词性标注，返回((词, 词性), )元组。结果按文本缓存在共用的Segmenter中，批量处理见Segmenter.cut_batch """
+        return get_segmenter().cut(self.clean_text)  # tuple(tuple(str, str), )
+
     @property
     def sentences(self):
-        """ 将文本分割成句子，返回元组 """
-        text_split = settings.pattern_sentences.split(self.clean_text)  # 不保留匹配项。 (正则式加上括号，可以保留匹配项)
-        sentences = filter(lambda s: True if s else False, text_split)
-        return tuple(sentences)  # tuple(str, )
+        """ 将文本分割成句子，返回元组。结果在实例中缓存 """
+        if self._sentences is None:
+            text_split = settings.pattern_sentences.split(self.clean_text)  # 不保留匹配项。 (正则式加上括号，可以保留匹配项)
+            self._sentences = tuple(filter(None, text_split))
+        return self._sentences  # tuple(str, )
 
     @staticmethod
     def period2num(period_string):
@@ -225,14 +510,168 @@ class TextProcessor:
         return result  # int
 
 
+class KeywordMatcher:
+    """ 多关键词匹配器。将多组关键词合并为一个正则表达式，一次扫描文本即返回命中的组名集合 """
+    """ 关键词按长度降序排列，并记录每个关键词的前缀中所含的其他关键词，因此同一位置的重叠命中不会遗漏 """
+
+    def __init__(self, keyword_dict):
+        self.keyword_dict = keyword_dict  # 传入{组名: 关键词元组}
+        keywords = sorted({k for group in keyword_dict.values() for k in group}, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(map(re.escape, keywords)))
+        self.names_of = {}  # 关键词 -> 该位置同时命中的组名集合
+        for keyword in keywords:
+            self.names_of[keyword] = frozenset(
+                name for name, group in keyword_dict.items() for k in group if keyword.startswith(k)
+            )
+        self.all_names = frozenset(keyword_dict.keys())
+
+    def hits(self, text):
+        """ 返回text中命中的组名集合 """
+        hits = set()
+        if text:
+            search = self.pattern.search
+            match = search(text)
+            while match:
+                hits |= self.names_of[match.group()]
+                if len(hits) == len(self.all_names):  # 已全部命中
+                    break
+                match = search(text, match.start() + 1)  # 从下一个字符继续，以免漏掉重叠的关键词
+        return frozenset(hits)  # frozenset(str, )
+
+
+def _init_segmenter(cache_file):
+    """ 进程池的初始化函数：每个子进程只加载一次词典 """
+    Segmenter.load_dictionary(cache_file)
+
+
+def _segment_texts(texts):
+    """ 在子进程中执行：分词和词性标注，返回各文本的((词, 词性), )元组的列表 """
+    return [tuple((pair.word, pair.flag) for pair in pseg.cut(text)) for text in texts]  # list[tuple, ]
+
+
+class Segmenter:
+    """ 上下文管理器 """
+    """ 批量分词和词性标注。词典只加载一次，可指定jieba的词典缓存文件cache_file（不存在时加载后自动生成） """
+    """ workers大于1时由进程池并行分词，子进程在初始化时加载词典；结果按文本的md5缓存，最多cache_size条 """
+    """ 缓存的是完整的分词结果，一审文本每条约数KB到数十KB，cache_size应按可用内存设置 """
+    SHARED_CACHE_SIZE = 256  # get_segmenter共用分词器的缓存条数
+
+    def __init__(self, cache_file=None, workers=1, chunk_size=64, cache_size=1000):
+        self.cache_file = cache_file
+        self.workers = workers
+        self.chunk_size = chunk_size  # 每次分发给子进程的文本数
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # {文本的md5: ((词, 词性), )}，按最近使用排序
+        self.pool = None
+
+    @staticmethod
+    def load_dictionary(cache_file=None):
+        """ 加载jieba词典。已加载时不重复加载 """
+        if cache_file:
+            jieba.dt.cache_file = cache_file
+        jieba.initialize()
+
+    def __enter__(self):
+        self.load_dictionary(self.cache_file)
+        if self.workers > 1:
+            self.pool = Pool(self.workers, initializer=_init_segmenter, initargs=(self.cache_file, ))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    @staticmethod
+    def text_key(text):
+        return hashlib.md5(text.encode('utf-8')).digest()  # bytes
+
+    def remember(self, key, words):
+        self.cache[key] = words
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def cut(self, text):
+        """ 分词和词性标注，返回((词, 词性), )元组 """
+        key = self.text_key(text)
+        words = self.cache.get(key)
+        if words is None:
+            words = _segment_texts([text])[0]
+            self.remember(key, words)
+        else:
+            self.cache.move_to_end(key)
+        return words  # tuple(tuple(str, str), )
+
+    def cut_batch(self, texts):
+        """ 批量分词，返回与texts顺序相同的((词, 词性), )元组的列表。只对未缓存的文本分词，有进程池时并行 """
+        keys = [self.text_key(text) for text in texts]
+        results = {}  # 本批各文本的结果{md5: ((词, 词性), )}。不从self.cache读取：本批不同文本多于cache_size时会被淘汰
+        missing = OrderedDict()  # 未缓存的文本{md5: 文本}，同一批中重复的文本只分词一次
+        for key, text in zip(keys, texts):
+            if key in results or key in missing:
+                continue
+            words = self.cache.get(key)
+            if words is None:
+                missing[key] = text
+            else:
+                self.cache.move_to_end(key)
+                results[key] = words
+        missing_texts = list(missing.values())
+        if self.pool is not None and len(missing_texts) > self.chunk_size:
+            chunks = [missing_texts[i: i + self.chunk_size] for i in range(0, len(missing_texts), self.chunk_size)]
+            segmented = [words for chunk_words in self.pool.map(_segment_texts, chunks) for words in chunk_words]
+        else:
+            segmented = _segment_texts(missing_texts)
+        for key, words in zip(missing.keys(), segmented):
+            results[key] = words
+            self.remember(key, words)
+        return [results[key] for key in keys]  # list[tuple(tuple(str, str), ), ]
+
+    def stream(self, texts, batch_texts=1024):
+        """ 逐个返回各文本的((词, 词性), )元组。texts可为任意迭代器，每batch_texts个文本分一批 """
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_texts:
+                for words in self.cut_batch(batch):
+                    yield words
+                batch = []
+        if batch:
+            for words in self.cut_batch(batch):
+                yield words
+
+
+_segmenter = None  # TextProcessor.word_flags共用的单进程分词器，首次使用时创建
+
+
+def get_segmenter():
+    """ 返回当前进程共用的分词器。只缓存最近SHARED_CACHE_SIZE条结果，大批量分词请自行创建Segmenter """
+    global _segmenter
+    if _segmenter is None:
+        _segmenter = Segmenter(cache_size=Segmenter.SHARED_CACHE_SIZE)
+    return _segmenter  # Segmenter
+
+
 class ItemDumper:
     """ 要素输出的格式化。可同时格式化多个要素 """
 
     def __init__(self, *contents):
         self.contents = contents
 
-    def __format_one(self, item):
-        """ 格式化单个要素 """
+    @staticmethod
+    def format_date(item):
+        """ 格式化日期为YYYY-MM-DD。四位数年份直接拼接，避免调用strftime """
+        if item.year >= 1000:
+            return '{:04d}-{:02d}-{:02d}'.format(item.year, item.month, item.day)
+        return item.strftime('%Y-%m-%d')
+
+    @classmethod
+    def format_item(cls, item):
+        """ 格式化单个要素。按类型查表，查不到的类型（如bool、子类）按isinstance依次判断 """
+        formatter = cls.FORMATTERS.get(type(item))
+        if formatter is not None:
+            return formatter(item)
         result = 'None'  # 默认输出'None'
         if item is None:
             result = 'None'  # None输出'None'
@@ -243,59 +682,857 @@ class ItemDumper:
         elif isinstance(item, str):
             result = item.replace(',', '')  # 对字符串，消除逗号
         elif isinstance(item, datetime):
-            result = item.strftime('%Y-%m-%d')
+            result = cls.format_date(item)
         elif isinstance(item, (list, tuple)):
-            result = '+'.join([self.__format_one(a) for a in item])
+            result = '+'.join([cls.format_item(a) for a in item])
         return result
 
     def format(self):
         """ 单个输入返回单个，多个输入返回元组 """
         result = 'None'
         if len(self.contents) == 1:
-            result = self.__format_one(self.contents[0])
+            result = self.format_item(self.contents[0])
         elif len(self.contents) > 1:
-            result = tuple([self.__format_one(item) for item in self.contents])
+            result = tuple([self.format_item(item) for item in self.contents])
         return result
 
 
+ItemDumper.FORMATTERS = {  # 常见类型的格式化函数
+    type(None): lambda item: 'None',
+    int: str,
+    float: '{:.2f}'.format,
+    str: lambda item: item.replace(',', ''),  # 对字符串，消除逗号
+    datetime: ItemDumper.format_date,
+    list: lambda item: '+'.join([ItemDumper.format_item(a) for a in item]),
+    tuple: lambda item: '+'.join([ItemDumper.format_item(a) for a in item]),
+}
+
+
+class Progress:
+    """ 限频的进度显示。每完成every项，或距上次显示超过interval秒时，才打印一次 """
+
+    def __init__(self, template, every=10000, interval=5.0):
+        self.template = template  # 含一个{}占位符的字符串，如'export: {} rows done'
+        self.every = every
+        self.interval = interval
+        self.shown = 0  # 上次显示时的完成数
+        self.last_time = time.monotonic()
+
+    def update(self, done):
+        """ 传入当前的完成数，必要时打印进度 """
+        if done - self.shown >= self.every or time.monotonic() - self.last_time >= self.interval:
+            self.show(done)
+
+    def finish(self, done):
+        """ 结束时打印最终的完成数 """
+        if done != self.shown:
+            self.show(done)
+
+    def show(self, done):
+        print(self.template.format(done))
+        self.shown = done
+        self.last_time = time.monotonic()
+
+
+class Prefetcher:
+    """ 在后台线程中预先读取下一批数据，经有界队列交给主线程，使数据库读取与解析重叠进行 """
+    """ 记录队列深度和双方的等待时间：主线程常等待说明读取跟不上（DB-bound），后台线程常等待说明解析跟不上（CPU-bound） """
+
+    def __init__(self, batches, max_batches=2):
+        self.batches = batches  # 可迭代对象，每项为一批数据，在后台线程中遍历
+        self.queue = queue.Queue(max_batches)  # 最多预取max_batches批
+        self.stopped = threading.Event()
+        self.done_batches = 0
+        self.depth_total = 0  # 每次取出前的队列深度之和
+        self.max_depth = 0
+        self.stalls = 0  # 主线程取数时队列为空的次数
+        self.consumer_wait = 0.0  # 主线程等待数据的秒数
+        self.producer_wait = 0.0  # 后台线程等待队列空位的秒数
+
+    def put(self, item):
+        """ 在后台线程中执行：放入队列，队列满时等待；主线程已停止时返回False """
+        start_time = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.producer_wait += time.monotonic() - start_time
+        return not self.stopped.is_set()  # bool
+
+    def produce(self):
+        """ 在后台线程中执行：依次读取各批数据；结束或出错时放入(None, 异常) """
+        error = None
+        try:
+            for batch in self.batches:
+                if not self.put((batch, None)):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(self.batches, 'close'):
+                self.batches.close()  # 提前结束时释放数据库连接
+        self.put((None, error))
+
+    def __iter__(self):
+        thread = threading.Thread(target=self.produce, name='prefetcher', daemon=True)
+        thread.start()
+        try:
+            while True:
+                depth = self.queue.qsize()
+                self.depth_total += depth
+                self.max_depth = max(self.max_depth, depth)
+                if depth == 0 and self.done_batches:  # 第一批之前的等待不计为停顿
+                    self.stalls += 1
+                start_time = time.monotonic()
+                batch, error = self.queue.get()
+                self.consumer_wait += time.monotonic() - start_time
+                if batch is None:
+                    if error is not None:
+                        raise error
+                    break
+                self.done_batches += 1
+                yield batch
+        finally:
+            self.stopped.set()
+            thread.join()
+
+    def stats(self):
+        """ 返回预取的统计，bound为'db'或'cpu'，表示等待较多的一方 """
+        return {
+            'batches': self.done_batches,
+            'avg_depth': round(self.depth_total / max(self.done_batches, 1), 2),
+            'max_depth': self.max_depth,
+            'stalls': self.stalls,
+            'consumer_wait': round(self.consumer_wait, 3),
+            'producer_wait': round(self.producer_wait, 3),
+            'bound': 'db' if self.consumer_wait > self.producer_wait else 'cpu',
+        }  # dict
+
+
+class MysqlSource:
+    """ 文书来源：数据库。按id顺序分批读取tag为0的行，每行为(row_id, 编码的paper_content) """
+    """ 以id为键分页：每批读取 id > 上一批最大id 的前batch_size行，不再逐个id查询 """
+    """ 指定row_ids（如TextIndex.search的结果）时只按id顺序读取其中的行，每批batch_size个id """
+
+    def __init__(self, batch_size=None, row_ids=None):
+        self.batch_size = batch_size or settings.MysqlParameter.batch_size
+        self.row_ids = None if row_ids is None else sorted(set(row_ids))
+
+    def batches(self):
+        """ 返回各批数据行的列表的迭代器 """
+        if self.row_ids is not None:
+            for batch in self.id_batches():
+                yield batch
+            return
+        skip_row_ids = set(settings.MysqlParameter.skip_row_ids)
+        # 在此修改检索条件。tag非0表示该项数据不适用，或存在问题
+        select_sql = 'select id, paper_content from {0} where id > %s and tag = 0 order by id limit %s'.format(
+            settings.MysqlParameter.used_table
+        )
+        with MysqlConnector() as mc:
+            last_id = 0
+            while True:
+                with mc.ss_cursor() as cursor:
+                    cursor.execute(select_sql, (last_id, self.batch_size))
+                    result = list(cursor)
+                if result:
+                    last_id = result[-1][0]
+                yield [row for row in result if row[0] not in skip_row_ids]
+                if len(result) < self.batch_size:  # 已读完
+                    break
+
+    def id_batches(self):
+        """ 返回row_ids中各批数据行的列表的迭代器 """
+        skip_row_ids = set(settings.MysqlParameter.skip_row_ids)
+        select_sql = 'select id, paper_content from {0} where id in ({{}}) and tag = 0 order by id'.format(
+            settings.MysqlParameter.used_table
+        )
+        with MysqlConnector() as mc:
+            for i in range(0, len(self.row_ids), self.batch_size):
+                row_ids = self.row_ids[i: i + self.batch_size]
+                with mc.ss_cursor() as cursor:
+                    cursor.execute(select_sql.format(','.join(['%s'] * len(row_ids))), tuple(row_ids))
+                    result = list(cursor)
+                yield [row for row in result if row[0] not in skip_row_ids]
+
+    def __iter__(self):
+        for batch in self.batches():
+            for row in batch:
+                yield row
+
+
+class JsonlSource:
+    """ 文书来源：本地快照，不需要数据库。每行一个json：{"id": row_id, "paper_content": 文书内容} """
+    """ path为单个.jsonl或.jsonl.gz文件，或包含多个分片文件的目录（按文件名顺序读取，见JsonlSnapshot） """
+    """ 文书内容可以是编码的字符串，也可以是未编码的json，PaperContentCoder.decode_json均可解码 """
+    """ 指定row_ids时只读取其中的行 """
+
+    def __init__(self, path, batch_size=None, row_ids=None):
+        self.path = path
+        self.batch_size = batch_size or settings.MysqlParameter.batch_size
+        self.row_ids = None if row_ids is None else set(row_ids)
+
+    def files(self):
+        if os.path.isdir(self.path):
+            file_paths = glob.glob(os.path.join(self.path, '*.jsonl')) + glob.glob(os.path.join(self.path, '*.jsonl.gz'))
+            return sorted(file_paths)  # list[str, ]
+        return [self.path]  # list[str, ]
+
+    def batches(self):
+        """ 返回各批数据行的列表的迭代器 """
+        skip_row_ids = set(settings.MysqlParameter.skip_row_ids)
+        batch = []
+        for file_path in self.files():
+            with (gzip.open if file_path.endswith('.gz') else open)(file_path, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = ujson.loads(line)
+                    if item['id'] in skip_row_ids or (self.row_ids is not None and item['id'] not in self.row_ids):
+                        continue
+                    batch.append((item['id'], item['paper_content']))
+                    if len(batch) >= self.batch_size:
+                        yield batch
+                        batch = []
+        yield batch
+
+    def __iter__(self):
+        for batch in self.batches():
+            for row in batch:
+                yield row
+
+
+class JsonlSnapshot:
+    """ 上下文管理器 """
+    """ 把数据行写成JsonlSource可读的快照。shard_rows为None时写入单个文件path（以.gz结尾时gzip压缩）； """
+    """ 否则path为目录，每shard_rows行一个分片part-00000.jsonl.gz。raw为True时保存解码后的json，读取时不必解压 """
+
+    def __init__(self, path, shard_rows=None, raw=False):
+        self.path = path
+        self.shard_rows = shard_rows
+        self.raw = raw
+        self.f = None
+        self.shard = 0
+        self.shard_done = 0
+        self.done_rows = 0
+        self.progress = Progress('snapshot: {} rows written', 10000, 5.0)
+
+    def __enter__(self):
+        if self.shard_rows:
+            os.makedirs(self.path, exist_ok=True)
+        else:
+            self.f = (gzip.open if self.path.endswith('.gz') else open)(self.path, 'wb')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        self.progress.finish(self.done_rows)
+
+    def open_shard(self):
+        if self.f is not None:
+            self.f.close()
+        shard_path = os.path.join(self.path, 'part-{:05d}.jsonl.gz'.format(self.shard))
+        self.f = gzip.open(shard_path, 'wb')
+        self.shard += 1
+        self.shard_done = 0
+
+    def write(self, row_id, paper_content):
+        """ 写入一行。raw为True时解压、解析后重新序列化嵌入该行，原json中的换行不会破坏jsonl的行结构 """
+        json_obj = PaperContentCoder.decode_json(paper_content) if self.raw else None
+        if json_obj is not None:
+            line = ujson.dumps({'id': row_id, 'paper_content': json_obj}, ensure_ascii=False).encode('utf-8') + b'\n'
+        else:  # 不是合法json的行保留原内容，读取时同样被跳过
+            line = ujson.dumps({'id': row_id, 'paper_content': paper_content}).encode('utf-8') + b'\n'
+        if self.shard_rows and (self.f is None or self.shard_done >= self.shard_rows):
+            self.open_shard()
+        self.f.write(line)
+        self.shard_done += 1
+        self.done_rows += 1
+        self.progress.update(self.done_rows)
+
+
 class Csv:
     """ 上下文管理器 """
-    """ 输出到csv文件 """
+    """ 输出到csv文件。可在创建时声明列名columns；各行先编码后暂存，每buffer_rows行批量写入 """
 
-    def __init__(self, csv_path):
+    def __init__(self, csv_path, columns=None, formatters=None, buffer_rows=1000, report_every=10000, report_interval=5.0):
         self.csv_path = csv_path
+        self.columns = tuple(columns) if columns else None  # 列名元组，未声明时取第一次export的参数名
+        self.formatters = formatters or {}  # 指定部分列的格式化函数{列名: 函数}，其余列用ItemDumper.format_item
+        self.column_formatters = self.get_column_formatters() if self.columns else None
+        self.buffer_rows = buffer_rows
+        self.buffer = []
         self.done_rows = 0
+        self.progress = Progress('export: {} rows done', report_every, report_interval)
+        self.encoding = 'gbk'
+        self.newline = os.linesep  # 与文本模式写入的换行符一致
 
     def __enter__(self):
-        self.f = open(self.csv_path, 'w', encoding='gbk')
+        self.f = open(self.csv_path, 'wb')
+        if self.columns:
+            self.write_header()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
         self.f.close()
+        self.progress.finish(self.done_rows)
+
+    def get_column_formatters(self):
+        """ 为每列确定格式化函数 """
+        return tuple(self.formatters.get(c, ItemDumper.format_item) for c in self.columns)
+
+    def write_header(self):
+        """ 写入首行标签 """
+        self.buffer.append(self.encode_line(','.join(self.columns)))
+
+    def encode_line(self, line):
+        """ 编码一行。无法以gbk编码时抛出UnicodeEncodeError，该行不会写入 """
+        line = line + '\n'
+        if self.newline != '\n':
+            line = line.replace('\n', self.newline)
+        return line.encode(self.encoding)  # bytes
+
+    def flush(self):
+        """ 将暂存的行一次写入文件 """
+        if self.buffer:
+            self.f.write(b''.join(self.buffer))
+            self.buffer = []
+
+    def encode_row(self, values):
+        """ 按声明的列顺序格式化并编码一行，返回bytes。无法编码时抛出UnicodeEncodeError """
+        line = ','.join([formatter(v) for formatter, v in zip(self.column_formatters, values)])
+        return self.encode_line(line)  # bytes
+
+    def write_encoded(self, encoded_line):
+        """ 输出一行已编码的内容 """
+        self.buffer.append(encoded_line)
+        self.done_rows += 1
+        if len(self.buffer) >= self.buffer_rows:
+            self.flush()
+        self.progress.update(self.done_rows)
+
+    def export_row(self, values):
+        """ 按声明的列顺序输出一行 """
+        self.write_encoded(self.encode_row(values))
 
     def export(self, **items):
         """ 输出一行到文件 """
-        if self.done_rows == 0:  # 写入首行标签
-            self.f.write(','.join(items.keys()))
-            self.f.write("\n")
+        if self.columns is None:  # 写入首行标签
+            self.columns = tuple(items.keys())
+            self.column_formatters = self.get_column_formatters()
+            self.write_header()
+        self.export_row(items.values())
+
+
+class Parquet:
+    """ 上下文管理器 """
+    """ 按列类型输出到parquet文件，各行在内存中按列暂存，每row_group_rows行写入一个行组。需另行安装pyarrow """
+    """ 列类型 int-整数 float-浮点数 date-日期 str-字符串 text-与csv相同的格式化字符串（用于混合类型的列） list-字符串列表 """
+
+    def __init__(self, parquet_path, columns, types, row_group_rows=100000, compression='zstd', report_every=10000, report_interval=5.0):
+        self.parquet_path = parquet_path
+        self.columns = tuple(columns)  # 列名元组
+        self.types = tuple(types[c] for c in self.columns)  # 传入{列名: 列类型}
+        self.row_group_rows = row_group_rows
+        self.compression = compression
+        self.buffer = [[] for _ in self.columns]
+        self.done_rows = 0
+        self.progress = Progress('export: {} rows done', report_every, report_interval)
+
+    def __enter__(self):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        arrow_types = {
+            'int': pyarrow.int64(), 'float': pyarrow.float64(), 'date': pyarrow.date32(),
+            'str': pyarrow.string(), 'text': pyarrow.string(), 'list': pyarrow.list_(pyarrow.string()),
+        }
+        self.schema = pyarrow.schema([(c, arrow_types[t]) for c, t in zip(self.columns, self.types)])
+        self.writer = pyarrow.parquet.ParquetWriter(self.parquet_path, self.schema, compression=self.compression)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+        self.writer.close()
+        self.progress.finish(self.done_rows)
+
+    @staticmethod
+    def convert(values, column_type):
+        """ 将一列的值转换为对应类型，None保持为None """
+        if column_type == 'int':
+            return [None if v is None else int(v) for v in values]
+        elif column_type == 'float':
+            return [None if v is None else float(v) for v in values]
+        elif column_type == 'date':
+            return [None if v is None else v.date() if isinstance(v, datetime) else v for v in values]
+        elif column_type == 'str':
+            return [None if v is None else str(v) for v in values]
+        elif column_type == 'text':
+            return [None if v is None else ItemDumper.format_item(v) for v in values]
+        elif column_type == 'list':
+            return [None if v is None else [str(a) for a in v] for v in values]
+        raise ValueError('unknown column type: {}'.format(column_type))
+
+    def flush(self):
+        """ 将暂存的行写为一个行组 """
+        if self.buffer[0]:
+            arrays = [
+                self.pa.array(self.convert(values, column_type), type=field.type)
+                for values, column_type, field in zip(self.buffer, self.types, self.schema)
+            ]
+            self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+            self.buffer = [[] for _ in self.columns]
 
-        self.f.write(','.join(map(lambda v: ItemDumper(v).format(), items.values())))
-        self.f.write("\n")
+    def export_row(self, values):
+        """ 按声明的列顺序输出一行 """
+        for column_values, v in zip(self.buffer, values):
+            column_values.append(v)
         self.done_rows += 1
-        print('export: {} rows done'.format(self.done_rows))
+        if len(self.buffer[0]) >= self.row_group_rows:
+            self.flush()
+        self.progress.update(self.done_rows)
+
+
+class HtmlWriter:
+    """ 上下文管理器 """
+    """ 批量输出html页面。layout: 'flat'为html_dir下每页一个文件；'sharded'按paper_id // shard_size分子目录 """
+    """ 'zip'、'tar'写入html_dir下的单个归档文件papers.zip或papers.tar，避免产生大量零散文件 """
+    LAYOUTS = ('flat', 'sharded', 'zip', 'tar')
+
+    def __init__(self, html_dir, layout='flat', shard_size=1000, buffer_size=1 << 20):
+        if layout not in self.LAYOUTS:
+            raise ValueError('layout must be one of {}'.format(', '.join(self.LAYOUTS)))
+        self.html_dir = html_dir
+        self.layout = layout
+        self.shard_size = shard_size
+        self.buffer_size = buffer_size  # 归档文件的写缓冲大小
+        self.archive = None
+        self.file = None
+        self.made_dirs = set()  # 已创建的分片目录
+        self.progress = Progress('html export: {} pages written', 10000, 5.0)
+        self.done_pages = 0
+
+    @property
+    def is_archive(self):
+        return self.layout in ('zip', 'tar')  # bool
+
+    def __enter__(self):
+        if self.is_archive:
+            archive_path = os.path.join(self.html_dir, 'papers.' + self.layout)
+            self.file = open(archive_path, 'wb', buffering=self.buffer_size)
+            if self.layout == 'zip':
+                self.archive = zipfile.ZipFile(self.file, 'w', zipfile.ZIP_DEFLATED)
+            else:
+                self.archive = tarfile.open(fileobj=self.file, mode='w')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.archive is not None:
+            self.archive.close()
+            self.file.close()
+            self.archive = self.file = None
+        self.progress.finish(self.done_pages)
+
+    def page_name(self, paper_id):
+        """ 页面在输出目录或归档中的相对路径 """
+        if self.layout == 'sharded':
+            return '{0}/{1}.html'.format(paper_id // self.shard_size, paper_id)  # str
+        return '{}.html'.format(paper_id)  # str
+
+    def write(self, paper_id, html):
+        """ 写入一页。html为utf-8编码的bytes """
+        page_name = self.page_name(paper_id)
+        if self.layout == 'zip':
+            self.archive.writestr(page_name, html)
+        elif self.layout == 'tar':
+            info = tarfile.TarInfo(page_name)
+            info.size = len(html)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(html))
+        else:
+            page_path = os.path.join(self.html_dir, page_name)
+            if self.layout == 'sharded':
+                page_dir = os.path.dirname(page_path)
+                if page_dir not in self.made_dirs:
+                    os.makedirs(page_dir, exist_ok=True)
+                    self.made_dirs.add(page_dir)
+            with open(page_path, 'wb') as f:  # 整页一次写入
+                f.write(html)
+        self.done_pages += 1
+        self.progress.update(self.done_pages)
+
+
+class DigestStore:
+    """ 上下文管理器 """
+    """ 本地sqlite库的基类：DIGEST_TABLE表按paper_id保存paper_content的摘要，VALID_COLUMN为该行是否解码成功的列或表达式 """
+    """ 供parser.stale_batch_generator比对，只重新处理内容有变化的行；已删除的行由delete_rows从库中删除 """
+    DIGEST_TABLE = 'papers'
+    VALID_COLUMN = 'valid'
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.db.commit()  # 中断时保留已保存的部分，下次只处理其余的行
+        self.db.close()
+
+    def digests(self, start_id, end_id):
+        """ 返回start_id < id <= end_id 的已保存摘要{row_id: (digest, 是否解码成功)}。end_id为None时不设上限 """
+        select_sql = 'select id, digest, {0} from {1} where id > ?'.format(self.VALID_COLUMN, self.DIGEST_TABLE)
+        if end_id is None:
+            result = self.db.execute(select_sql, (start_id, ))
+        else:
+            result = self.db.execute(select_sql + ' and id <= ?', (start_id, end_id))
+        return dict((row_id, (digest, valid)) for row_id, digest, valid in result)  # dict{int: (str, int)}
+
+    def delete_rows(self, row_ids):
+        """ 删除各行保存的全部内容 """
+        self.db.executemany('delete from {0} where id = ?'.format(self.DIGEST_TABLE), [(row_id, ) for row_id in row_ids])
+
+    def delete_missing(self, start_id, end_id, row_ids):
+        """ 删除start_id < id <= end_id 中不在row_ids里的行，即已删除或tag已改为非0的行。end_id为None时不设上限 """
+        row_ids = set(row_ids)
+        self.delete_rows([row_id for row_id in self.digests(start_id, end_id) if row_id not in row_ids])
+
+    def commit(self):
+        self.db.commit()
+
+
+class VersionedStore(DigestStore):
+    """ 除摘要外，VALUE_TABLE表按(name, id)保存各部分的计算结果及其版本，版本有变化的部分也需重新计算 """
+    VALUE_TABLE = None
+
+    def fresh_features(self, start_id, end_id, versions):
+        """ 返回start_id < id <= end_id 中版本与versions{名称: 版本}一致的计算结果{row_id: set(名称)} """
+        select_sql = 'select id from {0} where name = ? and version = ? and id > ?'.format(self.VALUE_TABLE)
+        fresh = {}
+        for name, version in versions.items():
+            if end_id is None:
+                result = self.db.execute(select_sql, (name, version, start_id))
+            else:
+                result = self.db.execute(select_sql + ' and id <= ?', (name, version, start_id, end_id))
+            for (row_id, ) in result:
+                fresh.setdefault(row_id, set()).add(name)
+        return fresh  # dict{int: set(str, )}
+
+
+class Checkpoint(DigestStore):
+    """ 上下文管理器 """
+    """ 增量处理的检查点，保存在本地sqlite文件中。记录每行paper_content的摘要和处理结果，以及本轮已处理到的id """
+    """ signature为处理逻辑的标识（如输出的列名），与上次不同时清空已保存的结果 """
+    DIGEST_TABLE = 'rows'
+    VALID_COLUMN = 'result is not null'
+
+    def __init__(self, checkpoint_path, signature=''):
+        self.store_path = checkpoint_path
+        self.signature = signature
+        self.pending = OrderedDict()  # 已交给解析、尚未保存结果的行{row_id: digest}，按id升序
+
+    def __enter__(self):
+        self.db = sqlite3.connect(self.store_path)
+        self.db.execute('create table if not exists meta (key text primary key, value text)')
+        self.db.execute('create table if not exists rows (id integer primary key, digest text, result blob)')
+        if self.get_meta('signature') != self.signature:
+            self.db.execute('delete from rows')
+            self.set_meta('signature', self.signature)
+            self.set_meta('complete', '1')
+            self.set_meta('last_id', '0')
+        self.db.commit()
+        return self
+
+    def get_meta(self, key, default=None):
+        result = self.db.execute('select value from meta where key = ?', (key, )).fetchone()
+        return result[0] if result else default  # str
+
+    def set_meta(self, key, value):
+        self.db.execute('insert or replace into meta values (?, ?)', (key, str(value)))
+
+    def save(self, row_id, digest, result):
+        """ 保存一行的摘要和处理结果。result为None表示该行无输出（如解码失败），下次同样跳过 """
+        self.db.execute('insert or replace into rows values (?, ?, ?)', (row_id, digest, result))
+
+    def results(self):
+        """ 按id顺序返回所有非空的处理结果 """
+        for (result, ) in self.db.execute('select result from rows where result is not null order by id'):
+            yield result
+
+    def items(self):
+        """ 按id顺序返回所有非空的(row_id, 处理结果) """
+        for row_id, result in self.db.execute('select id, result from rows where result is not null order by id'):
+            yield row_id, result
+
+
+class FeatureStore(VersionedStore):
+    """ 上下文管理器 """
+    """ 本地sqlite要素库，按paper_id保存提取出的要素及其版本，以及提取时paper_content的摘要 """
+    """ 标量要素直接保存，日期保存为'%Y-%m-%d %H:%M:%S'文本，列表、元组和字典保存为json（元组读出为列表） """
+    OPERATORS = ('=', '<>', '<', '<=', '>', '>=', 'like')
+    VALUE_TABLE = 'features'
+
+    def __enter__(self):
+        self.db = sqlite3.connect(self.store_path)
+        self.db.execute('create table if not exists papers (id integer primary key, digest text, valid integer)')
+        self.db.execute(
+            'create table if not exists features (id integer, name text, version text, value, kind text, '
+            'primary key (name, id))'
+        )
+        self.db.execute('create index if not exists features_id on features (id)')
+        self.db.commit()
+        return self
+
+    @staticmethod
+    def dump_value(value):
+        """ 要素值 -> (保存的值, 类型) """
+        if value is None or isinstance(value, (int, float, str)):
+            return value, 'value'
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S'), 'datetime'
+        return json.dumps(value, ensure_ascii=False, default=FeatureStore.dump_json_default), 'json'
+
+    @staticmethod
+    def dump_json_default(value):
+        if isinstance(value, datetime):
+            return {'$datetime': value.strftime('%Y-%m-%d %H:%M:%S')}
+        raise TypeError('{} is not serializable'.format(type(value).__name__))
+
+    @staticmethod
+    def load_json_hook(obj):
+        if len(obj) == 1 and '$datetime' in obj:
+            return datetime.strptime(obj['$datetime'], '%Y-%m-%d %H:%M:%S')
+        return obj
+
+    @staticmethod
+    def load_value(value, kind):
+        """ (保存的值, 类型) -> 要素值 """
+        if kind == 'datetime':
+            return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        if kind == 'json':
+            return json.loads(value, object_hook=FeatureStore.load_json_hook)
+        return value
+
+    def save(self, row_id, digest, values, versions, replace_all):
+        """ 保存一行的摘要和要素值values{要素名: 值}。values为None表示json解码失败，下次内容不变时同样跳过 """
+        """ replace_all为True时（内容有变化）先删除该行原有的全部要素 """
+        self.db.execute('insert or replace into papers values (?, ?, ?)', (row_id, digest, int(values is not None)))
+        if replace_all or values is None:
+            self.db.execute('delete from features where id = ?', (row_id, ))
+        if values:
+            self.db.executemany('insert or replace into features values (?, ?, ?, ?, ?)', [
+                (row_id, name, versions[name]) + self.dump_value(value) for name, value in values.items()
+            ])
+
+    def delete_rows(self, row_ids):
+        """ 删除各行的摘要和全部要素 """
+        missing = [(row_id, ) for row_id in row_ids]
+        self.db.executemany('delete from papers where id = ?', missing)
+        self.db.executemany('delete from features where id = ?', missing)
+
+    def select(self, names, **conditions):
+        """ 按id顺序返回各文书的(paper_id, 要素值, ...)，不访问数据库。names为要素名的序列 """
+        """ conditions为{要素名: 值}或{要素名: (运算符, 值)}，运算符见OPERATORS，如 """
+        """ select(['penalty'], cause='受贿罪', judge_date=('like', '2017%')) """
+        joins, args = [], []
+        for i, name in enumerate(names):
+            joins.append('left join features f{0} on f{0}.id = p.id and f{0}.name = ?'.format(i))
+            args.append(name)
+        for i, (name, condition) in enumerate(sorted(conditions.items())):
+            operator, value = condition if isinstance(condition, tuple) else ('=', condition)
+            if operator not in self.OPERATORS:
+                raise ValueError('operator must be one of {}'.format(', '.join(self.OPERATORS)))
+            joins.append('join features c{0} on c{0}.id = p.id and c{0}.name = ? and c{0}.value {1} ?'.format(
+                i, operator
+            ))
+            args.extend([name, self.dump_value(value)[0]])
+        select_sql = 'select p.id{0} from papers p {1} where p.valid = 1 order by p.id'.format(
+            ''.join(', f{0}.value, f{0}.kind'.format(i) for i in range(len(names))), ' '.join(joins)
+        )
+        for row in self.db.execute(select_sql, args):
+            yield (row[0], ) + tuple(self.load_value(row[i], row[i + 1]) for i in range(1, len(row), 2))
+
+
+class TextIndex(VersionedStore):
+    """ 上下文管理器 """
+    """ 本地sqlite倒排索引，按(paper_id, 段落标签类型)索引文书各部分的文本，不访问数据库即可按关键词或正则检索 """
+    """ 倒排表的词项为相邻的两个字；文本经zlib压缩后保存，用于核对候选，排除词项都出现但不相连的文本 """
+    """ 文本末尾补一个结束符END，每个字都是某个词项的首字，单字的关键词也可走索引 """
+    VALUE_TABLE = 'sections'
+    END = '\x00'
+
+    def __enter__(self):
+        self.db = sqlite3.connect(self.store_path)
+        self.db.execute('create table if not exists papers (id integer primary key, digest text, valid integer)')
+        self.db.execute(
+            'create table if not exists sections (id integer, label integer, name text, version text, text blob, '
+            'primary key (id, label))'
+        )
+        self.db.execute('create index if not exists sections_name on sections (name, id)')
+        self.db.execute(
+            'create table if not exists postings (gram text, label integer, id integer, primary key (gram, label, id)) '
+            'without rowid'
+        )
+        self.db.commit()
+        return self
+
+    @classmethod
+    def grams(cls, text):
+        """ 文本的全部词项（相邻两字） """
+        if not text:
+            return set()  # set(str, )
+        text += cls.END
+        return set(text[i: i + 2] for i in range(len(text) - 1))  # set(str, )
+
+    @staticmethod
+    def normalize(text):
+        """ 关键词按TextProcessor.normalized_text统一标点和全角数字，与索引的文本一致 """
+        return text.translate(TextProcessor.CLEAN_TABLE)  # str
+
+    def delete_sections(self, row_id, name=None):
+        """ 删除一行的全部部分（name为None时）或指定部分的文本及其倒排项 """
+        if name is None:
+            result = self.db.execute('select label, text from sections where id = ?', (row_id, )).fetchall()
+            self.db.execute('delete from sections where id = ?', (row_id, ))
+        else:
+            result = self.db.execute(
+                'select label, text from sections where id = ? and name = ?', (row_id, name)
+            ).fetchall()
+            self.db.execute('delete from sections where id = ? and name = ?', (row_id, name))
+        for label, text in result:
+            self.db.executemany('delete from postings where gram = ? and label = ? and id = ?', [
+                (gram, label, row_id) for gram in self.grams(zlib.decompress(text).decode('utf-8'))
+            ])
+
+    def save(self, row_id, digest, values, versions, replace_all):
+        """ 保存一行的摘要和各部分文本values{部分名: (标签类型, 文本)}。values为None表示json解码失败 """
+        """ replace_all为True时（内容有变化）先删除该行原有的全部部分，否则只替换values中的部分 """
+        self.db.execute('insert or replace into papers values (?, ?, ?)', (row_id, digest, int(values is not None)))
+        if replace_all or values is None:
+            self.delete_sections(row_id)
+        for name, (label, text) in (values or {}).items():
+            if not replace_all:
+                self.delete_sections(row_id, name)
+            self.db.execute('insert or replace into sections values (?, ?, ?, ?, ?)', (
+                row_id, label, name, versions[name], zlib.compress(text.encode('utf-8'))
+            ))
+            self.db.executemany('insert or ignore into postings values (?, ?, ?)', [
+                (gram, label, row_id) for gram in self.grams(text)
+            ])
+
+    def delete_rows(self, row_ids):
+        """ 删除各行的摘要、全部部分及其倒排项 """
+        for row_id in row_ids:
+            self.db.execute('delete from papers where id = ?', (row_id, ))
+            self.delete_sections(row_id)
+
+    def candidates(self, literals, labels=None):
+        """ 返回包含literals中全部字面字符串的所有词项的(row_id, 标签类型)集合。literals为空时返回全部部分 """
+        """ 单字按前缀检索以该字开头的词项 """
+        label_sql, label_args = '', []
+        if labels is not None:
+            label_sql = ' and label in ({0})'.format(','.join(['?'] * len(labels)))
+            label_args = list(labels)
+        selects, args = [], []
+        for gram in sorted(set(gram for literal in literals for gram in self.grams(literal) if gram[-1] != self.END)
+                           | set(literal for literal in literals if len(literal) == 1)):
+            if len(gram) == 1:
+                selects.append('select id, label from postings where gram >= ? and gram < ?' + label_sql)
+                args.extend([gram, chr(ord(gram) + 1)] + label_args)
+            else:
+                selects.append('select id, label from postings where gram = ?' + label_sql)
+                args.extend([gram] + label_args)
+        if not selects:
+            selects.append('select id, label from sections where 1 = 1' + label_sql)
+            args.extend(label_args)
+        return set(self.db.execute(' intersect '.join(selects), args))  # set(tuple(int, int), )
+
+    def texts(self, candidates):
+        """ 按id顺序返回候选部分(row_id, 标签类型, 文本)的迭代器 """
+        for row_id, label in sorted(candidates):
+            (text, ) = self.db.execute('select text from sections where id = ? and label = ?', (row_id, label)).fetchone()
+            yield row_id, label, zlib.decompress(text).decode('utf-8')
+
+    @staticmethod
+    def regex_literals(regex):
+        """ 返回正则表达式的任一匹配中必定出现的字面字符串列表，用于预筛选候选；忽略大小写时返回空列表 """
+        if regex.flags & re.IGNORECASE:
+            return []  # list[str, ]
+        literals = []
+
+        def collect(items):
+            current = []
+            for op, av in items:
+                if op is sre_parse.LITERAL:
+                    current.append(chr(av))
+                    continue
+                literals.append(''.join(current))
+                current = []
+                if op is sre_parse.SUBPATTERN:
+                    collect(av[-1])
+                elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+                    collect(av[2])
+            literals.append(''.join(current))
+
+        collect(sre_parse.parse(regex.pattern, regex.flags))
+        return [literal for literal in literals if literal]  # list[str, ]
+
+    def search(self, keyword, labels=None):
+        """ 返回文本包含关键词keyword的paper_id列表（按id排序）。labels为标签类型的序列，指定时只检索这些部分 """
+        """ 例如search('索贿', labels=[7])为一审法院认为部分提到索贿的文书 """
+        keyword = self.normalize(keyword)
+        texts = self.texts(self.candidates([keyword], labels))
+        return sorted(set(row_id for row_id, label, text in texts if keyword in text))  # list[int, ]
+
+    def search_regex(self, pattern, labels=None):
+        """ 返回文本匹配正则表达式pattern的paper_id列表（按id排序），pattern可为字符串或编译后的正则表达式 """
+        """ 文本为normalized_text，书写pattern时注意英文括号、冒号等已转为中文标点。先按正则中必定出现的字面字符串在倒排表中筛选候选，再用正则核对；labels同search """
+        regex = re.compile(pattern)
+        texts = self.texts(self.candidates(self.regex_literals(regex), labels))
+        return sorted(set(row_id for row_id, label, text in texts if regex.search(text)))  # list[int, ]
 
 
 class Samples:
-    """ 有放回的随机抽取人工抽检样本 """
-    def __init__(self, universe, num):
+    """ 随机抽取人工抽检样本，默认有放回 """
+    def __init__(self, universe, num, seed=None, replace=True, strata=None):
         self.universe = universe  # 传入总体，列表或元组类型，元素为可用的paper_id
         self.length = len(universe)  # 总体的数量
         self.num = num  # 抽取样本的数量
+        self.seed = seed  # 随机种子，指定后每次抽取的结果相同
+        self.replace = replace  # 是否有放回
+        self.strata = strata  # 与universe等长的分层标签序列，为None时不分层
+        if not replace and 0 < self.length < num:  # 分层与不分层一致：无放回时样本数量不能超过总体
+            raise ValueError('cannot draw {0} samples without replacement from {1} rows'.format(num, self.length))
+
+    def allocate(self):
+        """ 按各层的大小比例分配样本数量（最大余数法），返回{层标签: 样本数量}。总体为空时返回空字典 """
+        if self.length == 0:
+            return {}  # dict{str: int}
+        labels, counts = np.unique(np.array(self.strata, dtype=object).astype(str), return_counts=True)
+        quotas = counts * self.num / self.length
+        allocation = np.floor(quotas).astype(int)
+        remainders = quotas - allocation
+        for i in np.argsort(-remainders, kind='stable')[:self.num - allocation.sum()]:
+            allocation[i] += 1  # 样本数量不超过总体时，各层的样本数量也不超过该层的大小
+        return dict(zip(labels.tolist(), allocation.tolist()))  # dict{str: int}
 
     def choice(self):
-        """ 抽取样本。num: 抽取的样本数量 """
-        universe = np.array(self.universe, dtype='int32')  # 转化为整数类型的numpy数组
-        result = np.random.choice(universe, self.num, replace=True)
+        """ 抽取样本。num: 抽取的样本数量。分层时在各层内分别抽取，结果按层标签排列 """
+        rng = np.random.RandomState(self.seed)
+        universe = np.array(self.universe, dtype='int64')  # 转化为整数类型的numpy数组
+        if self.length == 0:  # 没有符合条件的行时样本为空
+            return ()  # tuple(int, )
+        if self.strata is None:
+            result = rng.choice(universe, self.num, replace=self.replace)
+        else:
+            strata = np.array(self.strata, dtype=object).astype(str)
+            result = [
+                rng.choice(universe[strata == label], size, replace=self.replace)
+                for label, size in self.allocate().items() if size > 0
+            ]
+            result = np.concatenate(result) if result else np.array([], dtype='int64')
         result = result.tolist()  # 转为普通列表
         return tuple(result)  # tuple(int, )
 
@@ -2,50 +2,231 @@
 
 
 import ujson
+import hashlib
 from paper_parser import settings
 from paper_parser import functions
-from datetime import datetime
+from types import MappingProxyType
+
+# html模板头部在导入时按{title}切分一次，输出时直接拼接，不再逐篇replace
+HTML_HEAD_BEFORE_TITLE, HTML_HEAD_AFTER_TITLE = settings.html_template_head.split('{title}')
+
+
+class FeatureProperty:
+    """ 按文书实例缓存的要素属性，每篇文书只计算一次 """
+    """ 计算结果存入实例的__dict__，之后的访问不再经过描述器；depends为直接依赖的属性名，用于级联失效 """
+    """ version为要素提取逻辑的版本，修改逻辑时递增，要素库据此只重新计算有变化的要素 """
+
+    def __init__(self, func, depends, version=1):
+        self.func = func
+        self.name = func.__name__
+        self.depends = depends  # tuple(str, )
+        self.version = version  # int
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
+
+
+def feature(*depends, version=1):
+    """ 要素属性装饰器，传入该要素直接依赖的属性名，以及提取逻辑的版本version。缓存的可变结果（dict、list）请勿就地修改 """
+    def decorator(func):
+        return FeatureProperty(func, depends, version)
+    return decorator
+
+
+class PaperIndex:
+    """ 文书的段落、句子索引，由json的paragraphs → subParagraphs → sentences展开为扁平列表 """
+    """ 段落一层在创建时展开；句子一层在首次调用sentences时才展开，缺少subParagraphs、sentences的文书只在读取句子时受影响 """
+    """ 段落i的句子为下标sentence_offsets[i]:sentence_offsets[i + 1]；label_paragraphs为{标签类型: 段落下标元组} """
+
+    def __init__(self, paragraphs):
+        self.paragraph_json = paragraphs or ()
+        # 标签、长度、文本保持json中的原值
+        self.paragraph_labels = [para['labelType'] for para in self.paragraph_json]
+        self.paragraph_names = [para['lableName'] for para in self.paragraph_json]
+        self.paragraph_lengths = [para['length'] for para in self.paragraph_json]
+        self.paragraph_texts = [para['text'] for para in self.paragraph_json]
+        self.label_paragraphs = {}
+        for i, label in enumerate(self.paragraph_labels):
+            self.label_paragraphs.setdefault(label, []).append(i)
+        self.label_paragraphs = dict((label, tuple(indexes)) for label, indexes in self.label_paragraphs.items())
+        self.sentence_offsets = None  # 句子一层尚未展开
+
+    def build_sentences(self):
+        """ 展开句子一层，只执行一次 """
+        sentence_labels, sentence_lengths, sentence_texts, sentence_offsets = [], [], [], [0]
+        for para in self.paragraph_json:
+            for sub_para in para.get('subParagraphs') or ():
+                for sent in sub_para.get('sentences') or ():
+                    sentence_labels.append(para['labelType'])
+                    sentence_lengths.append(sent['length'])
+                    sentence_texts.append(sent['text'])
+            sentence_offsets.append(len(sentence_texts))
+        self.sentence_labels = sentence_labels
+        self.sentence_lengths = sentence_lengths
+        self.sentence_texts = sentence_texts
+        self.sentence_offsets = sentence_offsets
+
+    def paragraph(self, i):
+        """ 返回第i个段落的四元组(标签类型，标签名，段落长度，段落) """
+        return self.paragraph_labels[i], self.paragraph_names[i], self.paragraph_lengths[i], self.paragraph_texts[i]
+
+    def paragraphs(self, label=None):
+        """ 返回段落四元组的迭代器。指定标签类型label时只返回该类型的段落 """
+        indexes = range(len(self.paragraph_texts)) if label is None else self.label_paragraphs.get(label, ())
+        for i in indexes:
+            yield self.paragraph(i)  # (int, str, int, str)
+
+    def sentences(self, label=None):
+        """ 返回句子三元组(所在段落的标签类型，句子长度，句子)的迭代器。指定标签类型label时只返回该类型段落中的句子 """
+        if self.sentence_offsets is None:
+            self.build_sentences()
+        offsets = self.sentence_offsets
+        if label is None:
+            ranges = ((0, offsets[-1]), )
+        else:
+            ranges = ((offsets[i], offsets[i + 1]) for i in self.label_paragraphs.get(label, ()))
+        for start, end in ranges:
+            for i in range(start, end):
+                yield self.sentence_labels[i], self.sentence_lengths[i], self.sentence_texts[i]  # (int, int, str)
+
+    def last_paragraph_text(self, label):
+        """ 该标签类型的最后一个段落的文本，没有时返回None """
+        indexes = self.label_paragraphs.get(label)
+        return self.paragraph_texts[indexes[-1]] if indexes else None  # str
 
 
 class Paper:
     """ 文书基类 """
 
-    # 接收id和json字符串
+    # 接收id和json字符串，也可直接接收已解析的json对象
     def __init__(self, row_id, paper_content):
         self.paper_id = row_id  # int
-        self.paper_content = paper_content  # str
+        self._paper_content = paper_content  # str、bytes或dict。新实例尚无缓存的要素，不必经过setter级联失效
+
+    @classmethod
+    def feature_dependents(cls):
+        """ 要素的反向依赖表，返回{属性名: 直接依赖该属性的要素名集合}。每个类只构建一次 """
+        dependents = cls.__dict__.get('_feature_dependents')
+        if dependents is None:
+            dependents = {}
+            for klass in reversed(cls.__mro__):
+                for name, attr in vars(klass).items():
+                    if isinstance(attr, FeatureProperty):
+                        dependents.setdefault(name, set())
+                        for depend in attr.depends:
+                            dependents.setdefault(depend, set()).add(name)
+            cls._feature_dependents = dependents
+        return dependents  # dict{str: set(str, )}
+
+    @classmethod
+    def feature_versions(cls):
+        """ 各要素的有效版本，返回{要素名: 版本字符串}。每个类只构建一次 """
+        """ 有效版本由要素自身及其直接、间接依赖的要素的version共同决定，依赖的逻辑变化时该要素也视为变化 """
+        versions = cls.__dict__.get('_feature_versions')
+        if versions is None:
+            versions = {}
+
+            def resolve(name):
+                if name not in versions:
+                    attr = getattr(cls, name, None)
+                    if not isinstance(attr, FeatureProperty):
+                        return ''  # 非要素属性（如paper_content）不参与版本
+                    parts = [str(attr.version)] + [resolve(depend) for depend in attr.depends]
+                    versions[name] = hashlib.md5('/'.join(parts).encode()).hexdigest()[:12]
+                return versions[name]
+
+            for name in cls.feature_dependents():
+                resolve(name)
+            cls._feature_versions = versions
+        return versions  # dict{str: str}
+
+    @classmethod
+    def feature_closure(cls, name):
+        """ 返回该属性自身（若为要素）及所有直接、间接依赖它的要素名。每个类每个属性只计算一次 """
+        closures = cls.__dict__.get('_feature_closures')
+        if closures is None:
+            closures = cls._feature_closures = {}
+        closure = closures.get(name)
+        if closure is None:
+            dependents = cls.feature_dependents()
+            targets, stack = set(), [name]
+            while stack:
+                target = stack.pop()
+                if target not in targets:
+                    targets.add(target)
+                    stack.extend(dependents.get(target, ()))
+            closure = closures[name] = frozenset(
+                target for target in targets if isinstance(getattr(cls, target, None), FeatureProperty)
+            )
+        return closure  # frozenset(str, )
+
+    def invalidate(self, *names):
+        """ 丢弃已缓存的要素。不传参数时丢弃全部；否则丢弃指定属性及所有直接、间接依赖它们的要素 """
+        if not names:
+            names = self.feature_dependents().keys()
+        cached = self.__dict__
+        for name in names:
+            for target in self.feature_closure(name):
+                cached.pop(target, None)
+        return 0
 
     @property
+    def paper_content(self):
+        return self._paper_content  # str、bytes或dict
+
+    @paper_content.setter
+    def paper_content(self, paper_content):
+        """ 更换文书内容时，同时丢弃所有依赖文书内容的要素 """
+        self._paper_content = paper_content
+        self.invalidate('paper_content')
+
+    @feature('paper_content')
     def json(self):
-        json = ujson.loads(self.paper_content)
-        return json
+        """ 文书json只解码一次，以只读映射的形式保存在实例中。文书内容已是解析结果时不再解码 """
+        """ 只有顶层是只读的：嵌套的列表、字典（paragraphs、all_judges等）仍与缓存共用，要素返回这些值时须先复制 """
+        paper_content = self.paper_content
+        if isinstance(paper_content, (str, bytes)):
+            paper_content = ujson.loads(paper_content)
+        json = MappingProxyType(paper_content)
+        return json  # MappingProxyType
+
+    def _copied(self, key):
+        """ 取出json中的值，列表复制后返回，调用方修改返回的列表不影响缓存的json """
+        value = self.json[key]
+        if isinstance(value, list):
+            value = list(value)
+        return value  # list或json中的原值
 
     # 以下皆可能返回None
-    @property
+    @feature('json')
     def jid(self):
         """ 获取文书jid """
         jid = self.json['jid'].upper()
         return jid  # str
 
-    @property
+    @feature('json')
     def paper_type(self):
         """ 获取文书类型 1-判决书 """
         paper_type = self.json['type']
         return paper_type  # int
 
-    @property
+    @feature('json')
     def case_number(self):
         """ 获取案号 """
         case_number = self.json['all_caseinfo_casenumber']
         return case_number  # str
 
-    @property
+    @feature('json')
     def title(self):
         """ 获取案件名 """
         title = self.json['all_caseinfo_casename']
         return title  # str
 
-    @property
+    @feature('json')
     def cause_tree(self):
         """ 获取案由树，返回六元组，0-树的深度 1-1级案由 2-2级案由... """
         cause_tree = [
@@ -56,19 +237,19 @@ class Paper:
         cause_tree.insert(0, tree_depth)
         return tuple(cause_tree)  # tuple(int, str, str, str, None, None)
 
-    @property
+    @feature('json')
     def cause(self):
         """ 获取案由 """
         cause = self.json['all_text_cause']
         return cause  # str
 
-    @property
+    @feature('json')
     def court(self):
         """ 获取法院名 """
         court = self.json['all_caseinfo_court']
         return court  # str
 
-    @property
+    @feature('json')
     def court_level(self):
         """ 获取法院级别 1-基层 2-中级 3-高级 4-最高 9-其他 """
         court_level_string = self.json['court_level']
@@ -86,13 +267,13 @@ class Paper:
                 court_level = 9
         return court_level  # int
 
-    @property
+    @feature('json')
     def trial_level(self):
         """ 获取审理级别 1-一审 """
         trial_level = self.json['all_caseinfo_leveloftria']
         return trial_level  # int
 
-    @property
+    @feature('json')
     def province(self):
         """ 获取省份，用行政代码表示。默认值是None """
         province_string = self.json['province']
@@ -104,7 +285,7 @@ class Paper:
                     break
         return province_id  # int
 
-    @property
+    @feature('json')
     def region(self):
         """ 获取地区，包含省份 """
         province = self.json['province']
@@ -114,7 +295,7 @@ class Paper:
             region = province + region_later if province else region_later
         return region  # str
 
-    @property
+    @feature('json')
     def city(self):
         """ 获取城市，包含省份 """
         province = self.json['province']
@@ -124,25 +305,25 @@ class Paper:
             city = province + city_later if province else city_later
         return city  # str
 
-    @property
+    @feature('json')
     def accept_date(self):
         """ 获取受理日期 """
         accept_date_string = self.json['accept_date']
         accept_date = None
         if accept_date_string:
-            accept_date = datetime.strptime(accept_date_string, "%Y-%m-%d")
+            accept_date = functions.parse_date(accept_date_string)
         return accept_date  # datetime类
 
-    @property
+    @feature('json')
     def judge_date(self):
         """ 获取结案日期 """
         judge_date_string = self.json['all_judgementinfo_date']
         judge_date = None
         if judge_date_string:
-            judge_date = datetime.strptime(judge_date_string, "%Y-%m-%d")
+            judge_date = functions.parse_date(judge_date_string)
         return judge_date  # datetime类
 
-    @property
+    @feature('judge_date', 'accept_date')
     def duration(self):
         """ 获取审理时长，按天数计 """
         time_delta = None
@@ -150,19 +331,19 @@ class Paper:
             time_delta = (self.judge_date - self.accept_date).days
         return time_delta  # int
 
-    @property
+    @feature('json')
     def chief_judge(self):
         """ 获取主审法官 """
         chief_judge = self.json['all_chief_judge']
         return chief_judge  # str
 
-    @property
+    @feature('json')
     def judges(self):
         """ 获取法官列表，包含主审法官，不含陪审员 """
-        judges = self.json['all_judges']
+        judges = self._copied('all_judges')
         return judges  # list[str, ]
 
-    @property
+    @feature('json')
     def jurors(self):
         """ 获取陪审员列表 """
         jurors_string = self.json['all_people_jury']
@@ -171,7 +352,7 @@ class Paper:
             jurors.extend(jurors_string.split(';'))
         return jurors  # list[str, ]
 
-    @property
+    @feature('judges', 'jurors')
     def full_court(self):
         """ 根据审理人数，判断是否合议庭 0-否 1-是 默认1 """
         full_court = 1
@@ -180,19 +361,19 @@ class Paper:
                 full_court = 0
         return full_court
 
-    @property
+    @feature('json')
     def clerk(self):
         """ 获取书记员姓名 """
         clerk = self.json['all_clerk']
         return clerk  # str
 
-    @property
+    @feature('json')
     def litigants(self):
         """ 获取当事人列表 """
-        litigants = self.json['all_litigant']
+        litigants = self._copied('all_litigant')
         return litigants  # list[str, ]
 
-    @property
+    @feature('json')
     def law_articles(self):
         """ 获取适用法律信息，返回包含二元组(法律名，法条名)的列表 """
         law_articles = []
@@ -206,55 +387,61 @@ class Paper:
                     law_articles.append((law_article_dict["lawName"], law_article_dict["tiaoName"]))
         return law_articles  # list[(str, str), ]
 
-    @property
+    @feature('json')
+    def paper_index(self):
+        """ 文书的段落、句子索引，每篇文书只展开一次 """
+        return PaperIndex(self.json['paragraphs'])  # PaperIndex
+
+    @feature('paper_index')
     def all_text(self):
         """ 获取文书全文 """
-        paragraphs = self.json['paragraphs']
-        all_text = ''
-        if paragraphs:
-            for para in paragraphs:
-                if para['text']:
-                    all_text += para['text']
+        all_text = ''.join(text for text in self.paper_index.paragraph_texts if text)
         return all_text  # str
 
     @property
     def all_paragraphs(self):
         """ 获取文书所有段落，返回包含四元组(标签类型，标签名，段落长度，段落)的迭代器 """
         """ (一审) 0-正文 1-当事人信息 2-案件概述 6-一审法院查明 7-一审法院认为 8-一审裁判结果 9-审判人员 10-裁判附件 """
-        paragraphs = self.json['paragraphs']
-        if paragraphs:
-            for para in paragraphs:
-                yield para['labelType'], para['lableName'], para['length'], para['text']  # (int, str, int, str)
+        return self.paper_index.paragraphs()
 
     @property
     def all_sentences(self):
         """ 获取文书所有句子，返回包含三元组(所在段落的标签类型，句子长度，句子)的迭代器 """
-        paragraphs = self.json['paragraphs']
-        if paragraphs:
-            for para in paragraphs:
-                sub_paragraphs = para['subParagraphs']
-                if sub_paragraphs:
-                    for sub_para in sub_paragraphs:
-                        sentences = sub_para['sentences']
-                        if sentences:
-                            for sent in sentences:
-                                yield para['labelType'], sent['length'], sent['text']  # (int, int, str)
+        return self.paper_index.sentences()
+
+    RENDER_VERSION = 1  # 修改render_html的输出格式时递增
+    RENDER_FEATURES = ('jid', 'cause', 'title', 'case_number', 'court', 'paper_index')  # render_html用到的要素
+
+    @classmethod
+    def render_version(cls):
+        """ render_html输出的版本：由输出格式、html模板、文本清洗逻辑及用到的要素的有效版本共同决定 """
+        versions = cls.feature_versions()
+        parts = [str(cls.RENDER_VERSION), settings.html_template_head, settings.html_template_tail,
+                 str(functions.TextProcessor.CLEAN_VERSION), repr(sorted(functions.TextProcessor.CLEAN_TABLE.items())),
+                 settings.pattern_delete_bracket_contents.pattern]
+        parts.extend(versions.get(name, '') for name in cls.RENDER_FEATURES)
+        return hashlib.md5('\n'.join(parts).encode('utf-8')).hexdigest()[:12]  # str
+
+    def render_html(self):
+        """ 生成文书内容的html，返回字符串。按段落输出，同时输出各段落标记 """
+        jid, cause, title, case_number, court = functions.ItemDumper(  # 格式化输出
+            self.jid, self.cause, self.title, self.case_number, self.court
+        ).format()
+        parts = [
+            HTML_HEAD_BEFORE_TITLE, str(self.paper_id), HTML_HEAD_AFTER_TITLE,
+            '<p>{0} {1}</p>\n<p>{2}</p>\n<p>{3}</p>\n<p>{4}</p>\n'.format(jid, cause, title, case_number, court),
+        ]
+        processor = functions.TextProcessor('')  # 各段落共用一个文本处理器，更换文本时清洗结果随之重置
+        for para in self.all_paragraphs:
+            processor.text = para[3]
+            parts.append('<p>{0}.{1}</p>\n<p>{2}</p>\n'.format(para[0], para[1], processor.clean_text))
+        parts.append(settings.html_template_tail)
+        return ''.join(parts)  # str
 
     def to_html(self, html_path):
         """ 输出文书内容到html文件。必须指定文件的绝对路径html_path """
-        """ 按段落输出，同时输出各段落标记 """
         with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(settings.html_template_head.replace('{title}', str(self.paper_id)))
-            jid, cause, title, case_number, court = functions.ItemDumper(  # 格式化输出
-                self.jid, self.cause, self.title, self.case_number, self.court
-            ).format()
-            f.write("""<p>{0} {1}</p>\n<p>{2}</p>\n<p>{3}</p>\n<p>{4}</p>\n""".format(jid, cause, title, case_number, court))
-            for para in self.all_paragraphs:
-                f.write("<p>{0}.{1}</p>\n<p>{2}</p>\n".format(
-                    para[0], para[1], functions.TextProcessor(para[3]).clean_text
-                ))
-            f.write(settings.html_template_tail)
-        print('to html finished at paper_id: {}'.format(self.paper_id))
+            f.write(self.render_html())
         return 0
 
 
@@ -262,46 +449,43 @@ class JudgePaper(Paper):
     """ 判决书类 paper_type = 1 """
 
     # 以下适用一审、二审、再审
-    @property
+    @feature('json')
     def lawyers(self):
         """ 获取律师信息，返回列表 """
-        lawyers = self.json['lawyer_term']
+        lawyers = self._copied('lawyer_term')
         return lawyers  # list[str, ]
 
-    @property
+    @feature('json')
     def lawyer_firms(self):
         """ 获取律所信息，返回列表 """
-        lawyer_firms = self.json['lawfirm_term']
+        lawyer_firms = self._copied('lawfirm_term')
         return lawyer_firms  # list[str, ]
 
-    @property
+    @feature('json')
     def litigant_info_text(self):
         """ 含各诉讼当事人基本信息的文本段 """
         litigant_info_text = self.json['all_text_litigantinfo']
         return litigant_info_text  # str
 
-    @property
+    @feature('json')
     def evidence_text(self):
         """ 含证据清单的文本 """
         evidence_text = self.json['evidence']
         return evidence_text  # str
 
-    @property
+    @feature('paper_index')
     def attachment_text(self):
-        """ 附件文本 """
-        attachment_text = None
-        for para in self.all_paragraphs:
-            if para[0] == 10:
-                attachment_text = para[3]
+        """ 附件文本，即最后一个标签类型为10的段落 """
+        attachment_text = self.paper_index.last_paragraph_text(10)
         return attachment_text
 
     # 以下暂时只适用一审
-    @property
+    @feature('trial_level', 'first_basic_processor')
     def is_delayed(self):
         """ 是否延期 0-否 1-是 默认0 """
         is_delayed = 0
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_basic_text).clean_text
+            text = self.first_basic_processor.clean_text
             match = settings.pattern_is_delayed.search(text)
             if match:
                 is_delayed = 1
@@ -313,43 +497,82 @@ class JudgePaper(Paper):
     # 以下暂时只适用再审
 
     # 以下仅适用一审
-    @property
+    @feature('json')
     def first_basic_text(self):
         """ 获取一审案件基本信息 """
         first_basic_text = self.json["firstinstance_text_basicinfo"]
         return first_basic_text  # str
 
-    @property
+    @feature('json')
     def first_fact_text(self):
         """ 获取一审案件事实：经审理查明 """
         first_fact_text = self.json['firstinstance_text_fact']
         return first_fact_text  # str
 
-    @property
+    @feature('json')
     def first_opinion_text(self):
         """ 获取一审案件法院意见：本院认为 """
         first_opinion_text = self.json['firstinstance_text_opinion']
         return first_opinion_text  # str
 
-    @property
+    @feature('json')
     def first_judge_text(self):
         """ 获取一审案件判决结果：判决如下 """
         first_judge_text = self.json['firstinstance_text_judgement']
         return first_judge_text  # str
 
-    @property
+    # 以下为一审各部分文本的缓存。每篇文书的各部分只清洗、截取一次，供各要素共用
+    @feature('first_basic_text')
+    def first_basic_processor(self):
+        """ 一审案件基本信息的文本处理器 """
+        first_basic_processor = functions.TextProcessor(self.first_basic_text)
+        return first_basic_processor  # TextProcessor
+
+    @feature('first_fact_text')
+    def first_fact_processor(self):
+        """ 一审案件事实的文本处理器 """
+        first_fact_processor = functions.TextProcessor(self.first_fact_text)
+        return first_fact_processor  # TextProcessor
+
+    @feature('first_opinion_text')
+    def first_opinion_processor(self):
+        """ 一审法院意见的文本处理器 """
+        first_opinion_processor = functions.TextProcessor(self.first_opinion_text)
+        return first_opinion_processor  # TextProcessor
+
+    @feature('first_judge_text')
+    def first_judge_processor(self):
+        """ 一审判决结果的文本处理器 """
+        first_judge_processor = functions.TextProcessor(self.first_judge_text)
+        return first_judge_processor  # TextProcessor
+
+    @feature('first_fact_processor')
+    def first_fact_prefix_text(self):
+        """ 清洗后的一审案件事实，截至'证据'，即事实部分 """
+        text = self.first_fact_processor.clean_text
+        first_fact_prefix_text = text[:text.find('证据')]
+        return first_fact_prefix_text  # str
+
+    @feature('first_opinion_processor')
+    def first_opinion_prefix_text(self):
+        """ 清洗后的一审法院意见，截至'辩护' """
+        text = self.first_opinion_processor.clean_text
+        first_opinion_prefix_text = text[:text.find('辩护')]
+        return first_opinion_prefix_text  # str
+
+    @feature('first_basic_processor')
     def is_designated(self):
         """ 是否指定管辖 0-否 1-是 默认0"""
         is_designated = 0
-        if '管辖' in functions.TextProcessor(self.first_basic_text).clean_text:
+        if '管辖' in self.first_basic_processor.clean_text:
             is_designated = 1
         return is_designated
 
-    @property
+    @feature('first_basic_processor')
     def is_simple_procedure(self):
         """ 是否简易程序 0-否 1-是 默认0 """
         is_simple_procedure = 0
-        text = functions.TextProcessor(self.first_basic_text).clean_text
+        text = self.first_basic_processor.clean_text
         if '简易程序' in text and '转为普通程序' not in text:
             is_simple_procedure = 1
         return is_simple_procedure
@@ -362,7 +585,7 @@ class JudgePaper(Paper):
 class CivilJudgePaper(JudgePaper):
     """ 民事判决书类 cause_tree[1] = '民事' """
 
-    @property
+    @feature('json')
     def accept_fee(self):
         """ 获取诉讼费 """
         accept_fee = int(self.json['acceptance_fee'])
@@ -371,8 +594,9 @@ class CivilJudgePaper(JudgePaper):
 
 class CrimeJudgePaper(JudgePaper):
     """ 刑事判决书类 cause_tree[1] = '刑事' """
+    OPINION_MATCHER = functions.KeywordMatcher(settings.OPINION_KEYWORDS)
 
-    @property
+    @feature('json')
     def prosecution(self):
         """ 获取公诉机关 """
         prosecution = self.json['prosecution_organ_term']
@@ -380,7 +604,7 @@ class CrimeJudgePaper(JudgePaper):
             prosecution = prosecution[0]
         return prosecution  # str
 
-    @property
+    @feature('law_articles')
     def crime_law_version(self):
         """ 判断所适用的刑法的版本，用修正时的年份表示。返回int """
         crime_law_version = None
@@ -392,31 +616,31 @@ class CrimeJudgePaper(JudgePaper):
         return crime_law_version  # int
 
     # 以下暂时仅适用一审
-    @property
+    @feature('trial_level', 'first_basic_processor')
     def prosecutors(self):
         """ 获取公诉人姓名列表 """
         prosecutors = []
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_basic_text).clean_text
+            text = self.first_basic_processor.clean_text
             match = settings.pattern_prosecutors.search(text)
             if match:
                 prosecutors = list(map(lambda a: settings.pattern_prosecutors_delete_strings.sub('', a), match.group(1).split('、')))
 
         return prosecutors  # list[str, ]
 
-    @property
+    @feature('trial_level', 'first_basic_processor')
     def prosecute_number(self):
         """ 获取起诉书号 """
         prosecute_number = None
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_basic_text).clean_text
+            text = self.first_basic_processor.clean_text
             match = settings.pattern_prosecute_number.search(text)
             if match:
                 prosecute_number = match.group(1)
 
         return prosecute_number  # str
 
-    @property
+    @feature('trial_level', 'litigant_info_text', 'litigants', 'judge_date')
     def defendant_info(self):
         """ 获取被告人信息字典 """
         text = functions.TextProcessor(self.litigant_info_text).clean_text
@@ -487,23 +711,23 @@ class CrimeJudgePaper(JudgePaper):
 
         return defendant_info  # dict
 
-    @property
+    @feature('trial_level', 'first_basic_processor')
     def is_plus_investigated(self):
         """ 是否有补充侦查 0-否 1-是 默认0 """
         is_plus_investigated = 0
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_basic_text).clean_text
+            text = self.first_basic_processor.clean_text
             if '补充侦查' in text:
                 is_plus_investigated = 1
 
         return is_plus_investigated  # int
 
-    @property
+    @feature('trial_level', 'first_opinion_processor')
     def defensive_opinion_sentences(self):
         """ 在法院认定意见中，获取含辩护意见的多个句子元组或空元组 """
         defensive_opinion_sentences = []
         if self.trial_level == 1:
-            opinion_sentences = functions.TextProcessor(self.first_opinion_text).sentences
+            opinion_sentences = self.first_opinion_processor.sentences
             if opinion_sentences:
                 if '本院认为' in opinion_sentences[0]:
                     for s in opinion_sentences:
@@ -511,7 +735,21 @@ class CrimeJudgePaper(JudgePaper):
                             defensive_opinion_sentences.append(s)
         return tuple(defensive_opinion_sentences)  # tuple(str, )
 
-    @property
+    @feature('first_opinion_processor', 'defensive_opinion_sentences')
+    def first_opinion_undefended_text(self):
+        """ 清洗后的一审法院意见，已消除辩护意见 """
+        first_opinion_undefended_text = self.first_opinion_processor.clean_text
+        for sentence in self.defensive_opinion_sentences:
+            first_opinion_undefended_text = first_opinion_undefended_text.replace(sentence, '')
+        return first_opinion_undefended_text  # str
+
+    @feature('first_opinion_undefended_text')
+    def first_opinion_undefended_hits(self):
+        """ 消除辩护意见后的一审法院意见中命中的情节关键词组，见settings.OPINION_KEYWORDS """
+        first_opinion_undefended_hits = self.OPINION_MATCHER.hits(self.first_opinion_undefended_text)
+        return first_opinion_undefended_hits  # frozenset(str, )
+
+    @feature('defensive_opinion_sentences')
     def is_defensive_opinions_accepted(self):
         """ 辩护意见是否被采信 0-不采信 1-部分采信 2-全部采信 """
         is_defensive_opinions_accepted = None
@@ -537,49 +775,37 @@ class CrimeJudgePaper(JudgePaper):
                     is_defensive_opinions_accepted = 0
         return is_defensive_opinions_accepted
 
-    @property
+    @feature('trial_level', 'first_opinion_undefended_hits')
     def is_leifan(self):
         """ 是否累犯 0-否 1-是 默认0 """
         is_leifan = 0
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            # 消除辩护意见
-            for sentence in self.defensive_opinion_sentences:
-                text = text.replace(sentence, '')
-            if '累犯' in text:
+            if 'leifan' in self.first_opinion_undefended_hits:
                 is_leifan = 1
 
         return is_leifan
 
-    @property
+    @feature('trial_level', 'first_opinion_undefended_hits')
     def is_ligong(self):
         """ 是否有立功情节 0-否 1-是 默认0 """
         is_ligong = 0
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            # 消除辩护意见
-            for sentence in self.defensive_opinion_sentences:
-                text = text.replace(sentence, '')
-            if '立功' in text:
+            if 'ligong' in self.first_opinion_undefended_hits:
                 is_ligong = 1
 
         return is_ligong
 
-    @property
+    @feature('trial_level', 'first_opinion_undefended_hits')
     def is_zishou(self):
         """ 是否有自首情节 0-否 1-是 默认0 """
         is_zishou = 0
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            # 消除辩护意见
-            for sentence in self.defensive_opinion_sentences:
-                text = text.replace(sentence, '')
-            if '自首' in text:
+            if 'zishou' in self.first_opinion_undefended_hits:
                 is_zishou = 1
 
         return is_zishou
 
-    @property
+    @feature('is_zishou', 'trial_level', 'first_opinion_undefended_hits')
     def is_tanbai(self):
         """ 是否有坦白情节 0-否 1-是 默认0 """
         """ 包含表述：坦白；认罪；如实供述；交代 """
@@ -587,26 +813,18 @@ class CrimeJudgePaper(JudgePaper):
         if self.is_zishou:  # 是自首的一定是坦白
             is_tanbai = 1
         elif self.trial_level == 1:
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            # 消除辩护意见
-            for sentence in self.defensive_opinion_sentences:
-                text = text.replace(sentence, '')
-            tanbai_match = settings.pattern_tanbai.search(text)
-            if tanbai_match:
+            if 'tanbai' in self.first_opinion_undefended_hits:
                 is_tanbai = 1
 
         return is_tanbai
 
-    @property
+    @feature('trial_level', 'first_opinion_undefended_text')
     def gongfan(self):
         """ 共犯状态 0-不区分主从 1-主犯 2-从犯 默认None """
         """ 目前只适用于单人的判决书 """
         gongfan = None
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            # 消除辩护意见
-            for sentence in self.defensive_opinion_sentences:
-                text = text.replace(sentence, '')
+            text = self.first_opinion_undefended_text
             no_zhucong_match = settings.pattern_gongfan['no_zhucong'].search(text)
             if no_zhucong_match:
                 gongfan = 0
@@ -619,12 +837,12 @@ class CrimeJudgePaper(JudgePaper):
                         gongfan = 2
         return gongfan
 
-    @property
+    @feature('trial_level', 'first_judge_processor')
     def penalty(self):
         """ 判决结果 """
         penalty = None
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_judge_text).clean_text.split('    ')[0]
+            text = self.first_judge_processor.clean_text.split('    ')[0]
             penalty = {'many': None, 'freedom': None, 'property': None, 'right': None, 'delay': None}
             # many 确定罪数
             many_strings = settings.pattern_penalty['many'].findall(text)
@@ -677,46 +895,48 @@ class CrimeJudgePaper(JudgePaper):
 
 class TanwuhuiluPaper(CrimeJudgePaper):
     """ 贪污贿赂罪刑事判决书类 cause_tree[2] = '贪污贿赂罪' """
+    OPINION_PREFIX_MATCHER = functions.KeywordMatcher(settings.OPINION_PREFIX_KEYWORDS)
+
+    @feature('first_opinion_prefix_text')
+    def first_opinion_prefix_hits(self):
+        """ 截至'辩护'的一审法院意见中命中的情节关键词组，见settings.OPINION_PREFIX_KEYWORDS """
+        first_opinion_prefix_hits = self.OPINION_PREFIX_MATCHER.hits(self.first_opinion_prefix_text)
+        return first_opinion_prefix_hits  # frozenset(str, )
 
     # 以下暂时只针对一审
-    @property
+    @feature('trial_level', 'first_basic_processor')
     def amount_unsure(self):
         """ 根据案件概述，初步获得起诉的总金额 """
         amount_unsure = None
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_basic_text).clean_text
-            moneys = functions.TextProcessor(text).extract_moneys()
+            moneys = functions.TextProcessor(self.first_basic_processor.clean_text).extract_moneys()
             if moneys:
                 amount_unsure = max(moneys)
 
         return amount_unsure  # float, 以万元为单位
 
-    @property
+    @feature('trial_level', 'first_opinion_prefix_text', 'first_fact_prefix_text')
     def amount_sure(self):
         """ 根据法院认定情况或已查明的事实，初步获得认定的总金额 """
         amount_sure = None
         if self.trial_level == 1:
             # 首先在法院认定情况中寻找
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            text = text[:text.find('辩护')]  # 截至'辩护'
-            moneys = functions.TextProcessor(text).extract_moneys()
+            moneys = functions.TextProcessor(self.first_opinion_prefix_text).extract_moneys()
             if moneys:
                 amount_sure = max(moneys)
             # 如果找不到，再在已查明的事实中寻找
             else:
-                text = functions.TextProcessor(self.first_fact_text).clean_text
-                text = text[:text.find('证据')]  # 定位事实部分
-                moneys = functions.TextProcessor(text).extract_moneys()
+                moneys = functions.TextProcessor(self.first_fact_prefix_text).extract_moneys()
                 if moneys:
                     amount_sure = max(moneys)
         return amount_sure  # float, 以万元为单位
 
-    @property
+    @feature('trial_level', 'first_fact_processor')
     def num_of_facts(self):
         """ 犯罪事实的数量。根据日期的数量综合判断 """
         num_of_facts = None
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_fact_text).clean_text
+            text = self.first_fact_processor.clean_text
             fact_date_ints = []
             all_match = settings.pattern_num_of_facts.finditer(text)
             for match in all_match:
@@ -732,7 +952,7 @@ class TanwuhuiluPaper(CrimeJudgePaper):
 
         return num_of_facts
 
-    @property
+    @feature('trial_level', 'defendant_info', 'first_fact_prefix_text')
     def job_info(self):
         """ 犯罪行为人或犯罪对象的职务信息，包括职务名、单位性质、职务级别。该字段在paper.defendant_info['job']的基础上针对贪污贿赂罪拓展 """
         job_info = {'job': None, 'job_type': None, 'job_grade': None}
@@ -741,9 +961,7 @@ class TanwuhuiluPaper(CrimeJudgePaper):
             if self.defendant_info['job'] is not None:  # 直接引用paper.defendant_info['job']
                 job_info['job'] = self.defendant_info['job']
             else:
-                text = functions.TextProcessor(self.first_fact_text).clean_text
-                text = text[:text.find('证据')]
-                job_match = settings.pattern_job_info['job'].search(text)
+                job_match = settings.pattern_job_info['job'].search(self.first_fact_prefix_text)
                 if job_match:
                     job_info['job'] = job_match.group(1)
             if job_info['job'] is not None:
@@ -763,27 +981,24 @@ class TanwuhuiluPaper(CrimeJudgePaper):
 
         return job_info
 
-    @property
+    @feature('trial_level', 'first_opinion_prefix_hits')
     def is_bad_effect(self):
         """ 是否造成恶劣社会影响/国家和人民利益损失 0否1是 默认0 """
         is_bad_effect = 0
         if self.trial_level == 1:
-            text = functions.TextProcessor(self.first_opinion_text).clean_text
-            text = text[:text.find('辩护')]
-            match = settings.pattern_bad_effect.search(text)
-            if match:
+            if 'bad_effect' in self.first_opinion_prefix_hits:
                 is_bad_effect = 1
 
         return is_bad_effect
 
     # 以下适用贪污、受贿、挪用公款罪
-    @property
+    @feature('trial_level', 'cause', 'first_opinion_processor')
     def money_usage(self):
         """ 赃款的用途 """
         money_usage = None
         if self.trial_level == 1:
             if self.cause in ('贪污罪', '受贿罪', '挪用公款罪'):
-                text = functions.TextProcessor(self.first_opinion_text).clean_text
+                text = self.first_opinion_processor.clean_text
                 match = settings.pattern_money_usage.search(text)
                 if match:
                     money_usage = match.group(1)
@@ -791,36 +1006,31 @@ class TanwuhuiluPaper(CrimeJudgePaper):
         return money_usage
 
     # 以下只针对贪污、受贿罪（根据2016年办理贪污贿赂案件司法解释）
-    @property
+    @feature('trial_level', 'cause', 'first_opinion_prefix_hits')
     def is_tuizang(self):
         """ 是否退赃 0否1是 默认0 """
         is_tuizang = None
         if self.trial_level == 1:
             if self.cause in ('贪污罪', '受贿罪'):
                 is_tuizang = 0
-                text = functions.TextProcessor(self.first_opinion_text).clean_text
-                text = text[:text.find('辩护')]
-                if '退' in text:  # 退回 退赃 退缴 退清 退出 退交 退还 退赔 退完
+                if 'tuizang' in self.first_opinion_prefix_hits:  # 退回 退赃 退缴 退清 退出 退交 退还 退赔 退完
                     is_tuizang = 1
 
         return is_tuizang
 
-    @property
+    @feature('trial_level', 'cause', 'first_opinion_prefix_hits')
     def is_punished_by_party_admin(self):
         """ 是否曾因贪污、受贿受过党纪、行政处分 0否1是 默认0 """
         is_punished_by_party_admin = None
         if self.trial_level == 1:
             if self.cause in ('贪污罪', '受贿罪'):
                 is_punished_by_party_admin = 0
-                text = functions.TextProcessor(self.first_opinion_text).clean_text
-                text = text[:text.find('辩护')]
-                match = settings.pattern_punished_by_party_admin.search(text)
-                if match:
+                if 'punished_by_party_admin' in self.first_opinion_prefix_hits:
                     is_punished_by_party_admin = 1
 
         return is_punished_by_party_admin
 
-    @property
+    @feature('trial_level', 'cause', 'is_leifan', 'first_opinion_prefix_hits')
     def is_punished_by_criminal_law(self):
         """ 是否曾因故意犯罪受过刑事追究 0否1是 默认0 """
         is_punished_by_criminal_law = None
@@ -830,55 +1040,45 @@ class TanwuhuiluPaper(CrimeJudgePaper):
                     is_punished_by_criminal_law = 1
                 else:
                     is_punished_by_criminal_law = 0
-                    text = functions.TextProcessor(self.first_opinion_text).clean_text
-                    text = text[:text.find('辩护')]
-                    match = settings.pattern_punished_by_criminal_law.search(text)
-                    if match:
+                    if 'punished_by_criminal_law' in self.first_opinion_prefix_hits:
                         is_punished_by_criminal_law = 1
 
         return is_punished_by_criminal_law
 
     # 以下针对贪污、挪用公款罪
-    @property
+    @feature('trial_level', 'cause', 'first_opinion_prefix_hits')
     def is_special_money(self):
         """ 是否贪污特定款项 0否1是 默认0 """
         is_special_money = None
         if self.trial_level == 1:
             if self.cause in ('贪污罪', '挪用公款罪'):
                 is_special_money = 0
-                text = functions.TextProcessor(self.first_opinion_text).clean_text
-                text = text[:text.find('辩护')]
-                match = settings.pattern_special_money.search(text)
-                if match:
+                if 'special_money' in self.first_opinion_prefix_hits:
                     is_special_money = 1
 
         return is_special_money
 
     # 以下只针对受贿罪
-    @property
+    @feature('trial_level', 'cause', 'first_opinion_prefix_hits')
     def is_suohui(self):
         """ 是否有索贿情节 0否1是 默认0 """
         is_suohui = None
         if self.trial_level == 1:
             if self.cause == '受贿罪':
                 is_suohui = 0
-                text = functions.TextProcessor(self.first_opinion_text).clean_text
-                text = text[:text.find('辩护')]
-                if '索贿' in text:
+                if 'suohui' in self.first_opinion_prefix_hits:
                     is_suohui = 1
 
         return is_suohui
 
-    @property
+    @feature('trial_level', 'cause', 'first_opinion_prefix_hits')
     def is_seek_promote(self):
         """ 是否谋求他人职务调整 0否1是 默认0 """
         is_seek_promote = None
         if self.trial_level == 1:
             if self.cause == '受贿罪':
                 is_seek_promote = 0
-                text = functions.TextProcessor(self.first_opinion_text).clean_text
-                text = text[:text.find('辩护')]
-                if '提拔' in text:
+                if 'seek_promote' in self.first_opinion_prefix_hits:
                     is_seek_promote = 1
 
         return is_seek_promote
@@ -5,125 +5,526 @@ from paper_parser import functions
 from paper_parser import settings
 from paper_parser import models
 from os import path
+from multiprocessing import Pool
+from collections import deque
+from itertools import islice
+from functools import partial
+import ujson
+import zlib
 
 
-def paper_generator():
-    """ 遍历文书对象 """
-    with functions.MysqlConnector() as mc:
-        select_sql = 'select {0} from {1} where id={{}}'.format(
-            ','.join(settings.MysqlParameter.columns), settings.MysqlParameter.used_table
-        )
-        for row_id in range(1, mc.max_id + 1):
-            if row_id in settings.MysqlParameter.skip_row_ids:
-                continue
-            mc.cursor.execute(select_sql.format(row_id))
-            result = mc.cursor.fetchone()
-            if not result:  # 不存在该id
-                continue
-            # 在此修改检索条件
-            tag = result[settings.MysqlParameter.columns.index('tag')]
-            if tag != 0:  # 非0表示该项数据不适用，或存在问题
-                continue
-            paper_content_encoded = result[settings.MysqlParameter.columns.index('paper_content')]
-            paper_content_decoded = functions.PaperContentCoder.decode(paper_content_encoded)
-            if not paper_content_decoded:  # json解码失败
-                continue
-            yield models.TanwuhuiluPaper(row_id, paper_content_decoded)
-
-
-def paper_html_export(html_dir):
-    """ 输出文书html。须指定输出的目录html_dir """
-    if path.isdir(html_dir):
-        for paper in paper_generator():
-            file_name = '{}.html'.format(paper.paper_id)
-            file_path = path.join(html_dir, file_name)
-            paper.to_html(file_path)
+def row_generator(batch_size=None, prefetch_batches=None, source=None):
+    """ 按id顺序分批读取数据行，返回包含二元组(row_id, paper_content)的迭代器 """
+    """ source为文书来源，默认为数据库functions.MysqlSource(batch_size)，也可为本地快照functions.JsonlSource """
+    """ prefetch_batches大于0时，由后台线程预取之后的批次，结束时打印预取统计；默认见settings """
+    if prefetch_batches is None:
+        prefetch_batches = settings.MysqlParameter.prefetch_batches
+    batches = (source or functions.MysqlSource(batch_size)).batches()
+    if prefetch_batches > 0:
+        batches = functions.Prefetcher(batches, prefetch_batches)
+    for batch in batches:
+        for row in batch:
+            yield row
+    if prefetch_batches > 0:
+        print('prefetch: {}'.format(batches.stats()))
+
+
+def paper_generator(batch_size=None, source=None):
+    """ 遍历文书对象。可指定每批读取的行数batch_size，默认见settings；source同row_generator """
+    for row_id, paper_content_encoded in row_generator(batch_size, source=source):
+        paper_json = functions.PaperContentCoder.decode_json(paper_content_encoded)
+        if paper_json is None:  # json解码失败
+            continue
+        yield models.TanwuhuiluPaper(row_id, paper_json)
+
+
+def paper_snapshot(path, shard_rows=None, raw=False, source=None):
+    """ 导出数据行的快照，供JsonlSource在没有数据库的环境中读取。参数见functions.JsonlSnapshot """
+    with functions.JsonlSnapshot(path, shard_rows, raw) as snapshot:
+        for row_id, paper_content in row_generator(source=source):
+            snapshot.write(row_id, paper_content)
     return 0
 
 
-def paper_export(csv_path):
+# 输出的列，依次为三元组(列名，文书属性名，属性中的键)。键为None时直接输出属性值
+EXPORT_COLUMNS = (
+    ('paper_id', 'paper_id', None),
+    ('paper_type', 'paper_type', None),
+    ('case_number', 'case_number', None),
+    ('cause', 'cause', None),
+    ('court', 'court', None),
+    ('court_level', 'court_level', None),
+    ('trial_level', 'trial_level', None),
+    ('province', 'province', None),
+    ('region', 'region', None),
+    ('city', 'city', None),
+    ('accept_date', 'accept_date', None),
+    ('judge_date', 'judge_date', None),
+    ('duration', 'duration', None),
+    ('chief_judge', 'chief_judge', None),
+    ('judges', 'judges', None),
+    ('jurors', 'jurors', None),
+    ('full_court', 'full_court', None),
+    ('clerk', 'clerk', None),
+    ('lawyers', 'lawyers', None),
+    ('lawyer_firms', 'lawyer_firms', None),
+    ('is_delayed', 'is_delayed', None),
+    ('is_designated', 'is_designated', None),
+    ('is_simple_procedure', 'is_simple_procedure', None),
+    ('prosecution', 'prosecution', None),
+    ('crime_law_version', 'crime_law_version', None),
+    ('prosecutors', 'prosecutors', None),
+    ('prosecute_number', 'prosecute_number', None),
+    ('defendant_name', 'defendant_info', 'name'),
+    ('defendant_is_name_covered', 'defendant_info', 'is_name_covered'),
+    ('defendant_sex', 'defendant_info', 'sex'),
+    ('defendant_birth', 'defendant_info', 'birth'),
+    ('defendant_age', 'defendant_info', 'age'),
+    ('defendant_tribe', 'defendant_info', 'tribe'),
+    ('defendant_is_minor', 'defendant_info', 'is_minor'),
+    ('defendant_educated', 'defendant_info', 'educated'),
+    ('is_plus_investigated', 'is_plus_investigated', None),
+    ('is_defensive_opinions_accepted', 'is_defensive_opinions_accepted', None),
+    ('is_leifan', 'is_leifan', None),
+    ('is_ligong', 'is_ligong', None),
+    ('is_zishou', 'is_zishou', None),
+    ('is_tanbai', 'is_tanbai', None),
+    ('gongfan', 'gongfan', None),
+    ('amounts_unsure', 'amount_unsure', None),
+    ('amounts_sure', 'amount_sure', None),
+    ('num_of_facts', 'num_of_facts', None),
+    ('job', 'job_info', 'job'),
+    ('job_type', 'job_info', 'job_type'),
+    ('job_grade', 'job_info', 'job_grade'),
+    ('is_bad_effect', 'is_bad_effect', None),
+    ('money_usage', 'money_usage', None),
+    ('is_tuizang', 'is_tuizang', None),
+    ('is_punished_by_party_admin', 'is_punished_by_party_admin', None),
+    ('is_punished_by_criminal_law', 'is_punished_by_criminal_law', None),
+    ('is_special_money', 'is_special_money', None),
+    ('is_suohui', 'is_suohui', None),
+    ('is_seek_promote', 'is_seek_promote', None),
+    ('penalty_many', 'penalty', 'many'),
+    ('penalty_freedom', 'penalty', 'freedom'),
+    ('penalty_property', 'penalty', 'property'),
+    ('penalty_right', 'penalty', 'right'),
+    ('penalty_delay', 'penalty', 'delay'),
+)
+
+
+# 输出为parquet时各列的类型，见functions.Parquet
+EXPORT_COLUMN_TYPES = {
+    'paper_id': 'int', 'paper_type': 'int', 'case_number': 'str', 'cause': 'str', 'court': 'str',
+    'court_level': 'int', 'trial_level': 'int', 'province': 'int', 'region': 'str', 'city': 'str',
+    'accept_date': 'date', 'judge_date': 'date', 'duration': 'int',
+    'chief_judge': 'str', 'judges': 'list', 'jurors': 'list', 'full_court': 'int', 'clerk': 'str',
+    'lawyers': 'list', 'lawyer_firms': 'list',
+    'is_delayed': 'int', 'is_designated': 'int', 'is_simple_procedure': 'int',
+    'prosecution': 'text', 'crime_law_version': 'int', 'prosecutors': 'list', 'prosecute_number': 'str',
+    'defendant_name': 'str', 'defendant_is_name_covered': 'int', 'defendant_sex': 'int', 'defendant_birth': 'date',
+    'defendant_age': 'int', 'defendant_tribe': 'str', 'defendant_is_minor': 'int', 'defendant_educated': 'int',
+    'is_plus_investigated': 'int', 'is_defensive_opinions_accepted': 'int',
+    'is_leifan': 'int', 'is_ligong': 'int', 'is_zishou': 'int', 'is_tanbai': 'int', 'gongfan': 'int',
+    'amounts_unsure': 'float', 'amounts_sure': 'float', 'num_of_facts': 'int',
+    'job': 'str', 'job_type': 'str', 'job_grade': 'str',
+    'is_bad_effect': 'int', 'money_usage': 'str', 'is_tuizang': 'int', 'is_punished_by_party_admin': 'int',
+    'is_punished_by_criminal_law': 'int', 'is_special_money': 'int', 'is_suohui': 'int', 'is_seek_promote': 'int',
+    'penalty_many': 'int', 'penalty_freedom': 'text', 'penalty_property': 'text', 'penalty_right': 'text',
+    'penalty_delay': 'int',
+}
+
+
+def select_columns(columns=None):
+    """ 按列名选取EXPORT_COLUMNS中的列，返回三元组的元组，顺序同columns。columns为None时返回全部列 """
+    if columns is None:
+        return EXPORT_COLUMNS
+    column_of = dict((column_item[0], column_item) for column_item in EXPORT_COLUMNS)
+    unknown = [column for column in columns if column not in column_of]
+    if unknown:
+        raise ValueError('unknown columns: {}'.format(', '.join(unknown)))
+    return tuple(column_of[column] for column in columns)  # tuple(tuple(str, str, str), )
+
+
+def paper_row(paper, export_columns=EXPORT_COLUMNS):
+    """ 按export_columns提取一篇文书的要素，返回元组 """
+    """ 要素在首次访问时才计算，只选取部分列时，未被选取的列及其独有的依赖都不会计算 """
+    row = []
+    for column, attr, key in export_columns:
+        value = getattr(paper, attr)
+        row.append(value if key is None else value[key])
+    return tuple(row)  # tuple
+
+
+def parse_rows(rows, export_columns=EXPORT_COLUMNS):
+    """ 解码数据行并提取要素，返回要素元组的迭代器。json解码失败的行被跳过 """
+    for row_id, paper_content_encoded in rows:
+        paper_json = functions.PaperContentCoder.decode_json(paper_content_encoded)
+        if paper_json is None:  # json解码失败
+            continue
+        yield paper_row(models.TanwuhuiluPaper(row_id, paper_json), export_columns)
+
+
+def _parse_rows(rows, export_columns=EXPORT_COLUMNS):
+    """ 在子进程中执行：解码一批数据行并提取要素，返回要素元组的列表 """
+    return list(parse_rows(rows, export_columns))  # list[tuple, ]
+
+
+def _render_rows(rows):
+    """ 在子进程中执行：解码一批数据行并生成html，返回(row_id, utf-8编码的html)的列表。json解码失败的行被跳过 """
+    pages = []
+    for row_id, paper_json in functions.PaperContentCoder.decode_json_batch(rows):
+        pages.append((row_id, models.TanwuhuiluPaper(row_id, paper_json).render_html().encode('utf-8')))
+    return pages  # list[tuple(int, bytes), ]
+
+
+def row_values_generator(workers=1, chunk_size=64, rows=None, handler=_parse_rows):
+    """ 按id顺序返回各文书的处理结果，默认为要素元组。workers大于1时，由进程池并行处理 """
+    """ 主进程读取数据库并按chunk_size分块分发，同时在途的块数不超过workers的2倍，结果按提交顺序取回 """
+    """ rows为(row_id, 编码的paper_content)的迭代器，默认读取整个表；handler处理一块数据行并返回结果列表 """
+    rows = iter(rows) if rows is not None else row_generator()
+    if workers <= 1:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            for values in handler(chunk):
+                yield values
+        return
+    with Pool(workers) as pool:
+        pending = deque()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if chunk:
+                pending.append(pool.apply_async(handler, (chunk, )))
+            if pending and (not chunk or len(pending) >= workers * 2):
+                for values in pending.popleft().get():
+                    yield values
+            if not chunk and not pending:
+                break
+
+
+def paper_export(csv_path, workers=1, chunk_size=64, columns=None, source=None):
     """ 输出文书信息。须指定输出文件的路径csv_path """
-    with functions.Csv(csv_path) as csv:
-        for _paper in paper_generator():
+    """ 可指定并行的进程数workers和每次分发给子进程的行数chunk_size，输出与单进程完全相同 """
+    """ 可指定输出的列名columns（见EXPORT_COLUMNS），只计算这些列所需的要素；默认输出全部列 """
+    """ 可指定文书来源source，默认读取数据库（见row_generator） """
+    export_columns = select_columns(columns)
+    handler = partial(_parse_rows, export_columns=export_columns)
+    rows = row_generator(source=source)
+    with functions.Csv(csv_path, tuple(column for column, attr, key in export_columns)) as csv:
+        for values in row_values_generator(workers, chunk_size, rows, handler):
             try:
-                csv.export(
-                    paper_id=_paper.paper_id,
-                    paper_type=_paper.paper_type,
-                    case_number=_paper.case_number,
-                    cause=_paper.cause,
-                    court=_paper.court,
-                    court_level=_paper.court_level,
-                    trial_level=_paper.trial_level,
-                    province=_paper.province,
-                    region=_paper.region,
-                    city=_paper.city,
-                    accept_date=_paper.accept_date,
-                    judge_date=_paper.judge_date,
-                    duration=_paper.duration,
-                    chief_judge=_paper.chief_judge,
-                    judges=_paper.judges,
-                    jurors=_paper.jurors,
-                    full_court=_paper.full_court,
-                    clerk=_paper.clerk,
-                    lawyers=_paper.lawyers,
-                    lawyer_firms=_paper.lawyer_firms,
-                    is_delayed=_paper.is_delayed,
-                    is_designated=_paper.is_designated,
-                    is_simple_procedure=_paper.is_simple_procedure,
-                    prosecution=_paper.prosecution,
-                    crime_law_version=_paper.crime_law_version,
-                    prosecutors=_paper.prosecutors,
-                    prosecute_number=_paper.prosecute_number,
-                    defendant_name=_paper.defendant_info['name'],
-                    defendant_is_name_covered=_paper.defendant_info['is_name_covered'],
-                    defendant_sex=_paper.defendant_info['sex'],
-                    defendant_birth=_paper.defendant_info['birth'],
-                    defendant_age=_paper.defendant_info['age'],
-                    defendant_tribe=_paper.defendant_info['tribe'],
-                    defendant_is_minor=_paper.defendant_info['is_minor'],
-                    defendant_educated=_paper.defendant_info['educated'],
-                    is_plus_investigated=_paper.is_plus_investigated,
-                    is_defensive_opinions_accepted=_paper.is_defensive_opinions_accepted,
-                    is_leifan=_paper.is_leifan,
-                    is_ligong=_paper.is_ligong,
-                    is_zishou=_paper.is_zishou,
-                    is_tanbai=_paper.is_tanbai,
-                    gongfan=_paper.gongfan,
-                    amounts_unsure=_paper.amount_unsure,
-                    amounts_sure=_paper.amount_sure,
-                    num_of_facts=_paper.num_of_facts,
-                    job=_paper.job_info['job'],
-                    job_type=_paper.job_info['job_type'],
-                    job_grade=_paper.job_info['job_grade'],
-                    is_bad_effect=_paper.is_bad_effect,
-                    money_usage=_paper.money_usage,
-                    is_tuizang=_paper.is_tuizang,
-                    is_punished_by_party_admin=_paper.is_punished_by_party_admin,
-                    is_punished_by_criminal_law=_paper.is_punished_by_criminal_law,
-                    is_special_money=_paper.is_special_money,
-                    is_suohui=_paper.is_suohui,
-                    is_seek_promote=_paper.is_seek_promote,
-                    penalty_many=_paper.penalty['many'],
-                    penalty_freedom=_paper.penalty['freedom'],
-                    penalty_property=_paper.penalty['property'],
-                    penalty_right=_paper.penalty['right'],
-                    penalty_delay=_paper.penalty['delay']
-                )
+                csv.export_row(values)
             except UnicodeEncodeError:
                 pass
 
 
-def get_samples(file_path, num=385):
-    """ 获取重复抽样样本的paper_id。必须指定输出文件的路径；可指定抽样数量，默认为385 """
-    # 获取抽样样本
-    paper_ids = []
+def paper_parquet_export(parquet_path, workers=1, chunk_size=64, row_group_rows=100000, columns=None, source=None):
+    """ 按列类型输出文书信息到parquet文件。须指定输出文件的路径parquet_path，需另行安装pyarrow """
+    """ 与paper_export相同的要素，但不因编码问题丢弃行；列表型要素保存为字符串列表。columns、source同paper_export """
+    export_columns = select_columns(columns)
+    handler = partial(_parse_rows, export_columns=export_columns)
+    columns = tuple(column for column, attr, key in export_columns)
+    rows = row_generator(source=source)
+    with functions.Parquet(parquet_path, columns, EXPORT_COLUMN_TYPES, row_group_rows) as parquet:
+        for values in row_values_generator(workers, chunk_size, rows, handler):
+            parquet.export_row(values)
+    return 0
+
+
+def stale_batch_generator(store, select_stale, last_id=0, batch_size=None):
+    """ 与本地库store（functions.DigestStore）比对，按id顺序分批返回需要重新处理的行 """
+    """ 先分批读取last_id之后各行paper_content的md5摘要（由数据库计算，不传输文书内容），已删除或tag改为非0的行从store中删除 """
+    """ select_stale(start_id, end_id, [(row_id, digest), ], 已保存的摘要)返回该批需要处理的{row_id: 附加信息}，只读取这些行的内容 """
+    """ 每批返回(batch_end_id, [(row_id, 编码的paper_content, 附加信息), ])，batch_end_id为None表示最后一批 """
+    batch_size = batch_size or settings.MysqlParameter.batch_size
+    skip_row_ids = set(settings.MysqlParameter.skip_row_ids)
+    digest_sql = 'select id, md5(paper_content) from {0} where id > %s and tag = 0 order by id limit %s'.format(
+        settings.MysqlParameter.used_table
+    )
+    content_sql = 'select id, paper_content from {0} where id in ({{}})'.format(settings.MysqlParameter.used_table)
+    with functions.MysqlConnector() as mc:
+        while True:
+            mc.cursor.execute(digest_sql, (last_id, batch_size))
+            result = mc.cursor.fetchall()
+            batch_end_id = result[-1][0] if len(result) == batch_size else None  # None表示已读到最后一批
+            digests = [(row_id, digest) for row_id, digest in result if row_id not in skip_row_ids]
+            store.delete_missing(last_id, batch_end_id, [row_id for row_id, digest in digests])
+            stale = select_stale(last_id, batch_end_id, digests, store.digests(last_id, batch_end_id))
+            rows = []
+            if stale:
+                mc.cursor.execute(content_sql.format(','.join(['%s'] * len(stale))), tuple(stale.keys()))
+                rows = [(row_id, paper_content_encoded, stale[row_id])
+                        for row_id, paper_content_encoded in sorted(mc.cursor.fetchall())]
+            yield batch_end_id, rows
+            if batch_end_id is None:
+                break
+            last_id = batch_end_id
+
+
+def changed_row_generator(checkpoint, batch_size=None):
+    """ 与检查点比对，返回新增或内容有变化的行(row_id, 编码的paper_content)的迭代器，比对见stale_batch_generator """
+    """ 返回的行及其摘要同时记入checkpoint.pending """
+
+    def select_changed(start_id, end_id, digests, saved):
+        return dict((row_id, digest) for row_id, digest in digests if saved.get(row_id, (None, None))[0] != digest)
+
+    last_id = 0 if checkpoint.get_meta('complete') == '1' else int(checkpoint.get_meta('last_id', 0))
+    checkpoint.set_meta('complete', '0')
+    for batch_end_id, rows in stale_batch_generator(checkpoint, select_changed, last_id, batch_size):
+        for row_id, paper_content_encoded, digest in rows:
+            checkpoint.pending[row_id] = digest
+            yield row_id, paper_content_encoded
+        if batch_end_id is not None and not checkpoint.pending:  # 该批之前的行已全部保存
+            checkpoint.set_meta('last_id', batch_end_id)
+
+
+def save_results(checkpoint, results, commit_rows, name):
+    """ 按id顺序把处理结果(row_id, 结果)保存到检查点，每commit_rows行提交一次；返回处理的行数 """
+    """ results须来自changed_row_generator(checkpoint)；其中缺少的行（json解码失败）保存为空结果 """
+    done_rows = 0
+    for row_id, result in results:
+        while checkpoint.pending:  # 排在该行之前、没有结果的行均为json解码失败
+            pending_id, digest = checkpoint.pending.popitem(last=False)
+            if pending_id == row_id:
+                break
+            checkpoint.save(pending_id, digest, None)
+        checkpoint.save(row_id, digest, result)
+        done_rows += 1
+        if done_rows % commit_rows == 0:
+            checkpoint.set_meta('last_id', row_id)
+            checkpoint.commit()
+            print('{0}: {1} changed rows parsed'.format(name, done_rows))
+    while checkpoint.pending:
+        pending_id, digest = checkpoint.pending.popitem(last=False)
+        checkpoint.save(pending_id, digest, None)
+    checkpoint.set_meta('complete', '1')
+    checkpoint.set_meta('last_id', 0)
+    checkpoint.commit()
+    print('{0}: {1} changed rows parsed'.format(name, done_rows))
+    return done_rows  # int
+
+
+def export_signature(versions=None):
+    """ 增量输出检查点的signature，由各列名及其所用文书属性的有效版本（见models.feature）组成 """
+    """ 要素逻辑修改、版本递增后signature随之变化，检查点中保存的结果全部失效并重新解析 """
+    if versions is None:
+        versions = models.TanwuhuiluPaper.feature_versions()
+    return ','.join('{0}:{1}'.format(column, versions.get(attr, '')) for column, attr, key in EXPORT_COLUMNS)
+
+
+def paper_incremental_export(csv_path, checkpoint_path, workers=1, chunk_size=64, batch_size=None):
+    """ 增量输出文书信息。须指定输出文件的路径csv_path和检查点文件的路径checkpoint_path """
+    """ 只解析新增或内容有变化的行，结果保存在检查点中，最后按id顺序与未变化的行合并输出，内容与paper_export相同 """
+    """ 中断后再次运行，从检查点记录的id继续 """
+    columns = tuple(column for column, attr, key in EXPORT_COLUMNS)
+    csv_writer = functions.Csv(csv_path, columns)
+
+    def encoded_lines(rows):
+        for values in row_values_generator(workers, chunk_size, rows):
+            try:
+                encoded_line = csv_writer.encode_row(values)
+            except UnicodeEncodeError:
+                encoded_line = None
+            yield values[0], encoded_line  # EXPORT_COLUMNS的第一列为paper_id
+
+    commit_rows = batch_size or settings.MysqlParameter.batch_size
+    with functions.Checkpoint(checkpoint_path, export_signature()) as checkpoint:
+        save_results(checkpoint, encoded_lines(changed_row_generator(checkpoint, batch_size)), commit_rows,
+                     'incremental export')
+        with csv_writer:
+            for encoded_line in checkpoint.results():
+                csv_writer.write_encoded(encoded_line)
+    return 0
+
+
+def paper_html_export(html_dir, workers=1, chunk_size=64, layout='flat', checkpoint_path=None, batch_size=None,
+                      source=None):
+    """ 输出文书html。须指定输出的目录html_dir """
+    """ 可指定并行的进程数workers、每次分发给子进程的行数chunk_size，以及输出的布局layout（见HtmlWriter） """
+    """ 指定检查点文件的路径checkpoint_path时，只生成新增或内容有变化的页面：目录布局下未变化的页面保留原文件， """
+    """ 归档布局下页面压缩保存在检查点中，最后按id顺序重新打包。已删除的行在目录布局下不删除原文件 """
+    """ 可指定文书来源source（见row_generator）；检查点需比对数据库中的摘要，只适用于数据库 """
+    if checkpoint_path is not None and source is not None:
+        raise ValueError('checkpoint_path only works with the database source')
+    if not path.isdir(html_dir):
+        return 0
+    html_writer = functions.HtmlWriter(html_dir, layout)
+    if checkpoint_path is None:
+        with html_writer:
+            for row_id, html in row_values_generator(workers, chunk_size, row_generator(source=source), _render_rows):
+                html_writer.write(row_id, html)
+        return 0
+
+    def written_pages(rows):
+        for row_id, html in row_values_generator(workers, chunk_size, rows, _render_rows):
+            if html_writer.is_archive:
+                yield row_id, zlib.compress(html)
+            else:
+                html_writer.write(row_id, html)
+                yield row_id, b''  # 页面已写入文件，检查点中只记录摘要
+
+    commit_rows = batch_size or settings.MysqlParameter.batch_size
+    signature = 'html:{0}:{1}:{2}'.format(layout, html_writer.shard_size, models.TanwuhuiluPaper.render_version())
+    with functions.Checkpoint(checkpoint_path, signature) as checkpoint:
+        if html_writer.is_archive:
+            save_results(checkpoint, written_pages(changed_row_generator(checkpoint, batch_size)), commit_rows,
+                         'html export')
+            with html_writer:
+                for row_id, page in checkpoint.items():
+                    html_writer.write(row_id, zlib.decompress(page))
+        else:
+            with html_writer:
+                save_results(checkpoint, written_pages(changed_row_generator(checkpoint, batch_size)), commit_rows,
+                             'html export')
+    return 0
+
+
+# 要素库保存的要素，即EXPORT_COLUMNS用到的全部文书属性
+STORE_FEATURES = tuple(sorted(set(attr for column, attr, key in EXPORT_COLUMNS) - {'paper_id'}))
+
+
+def _extract_features(rows):
+    """ 在子进程中执行：解码一批数据行(row_id, 编码的paper_content, 要素名集合)并提取指定的要素 """
+    """ 返回(row_id, {要素名: 值})的列表，json解码失败的行返回(row_id, None) """
+    results = []
+    for row_id, paper_content_encoded, names in rows:
+        paper_json = functions.PaperContentCoder.decode_json(paper_content_encoded)
+        if paper_json is None:  # json解码失败
+            results.append((row_id, None))
+            continue
+        paper = models.TanwuhuiluPaper(row_id, paper_json)
+        results.append((row_id, dict((name, getattr(paper, name)) for name in names)))
+    return results  # list[tuple(int, dict), ]
+
+
+def stale_row_generator(store, versions, pending, batch_size=None):
+    """ 与要素库比对，返回需要重新计算的行(row_id, 编码的paper_content, 要素名集合)的迭代器，比对见stale_batch_generator """
+    """ 内容摘要有变化的行计算全部要素；内容未变的行只计算版本有变化或尚未保存的要素 """
+    """ 返回的行记入pending{row_id: (digest, 是否计算全部要素)} """
+    all_names = frozenset(versions)
+
+    def select_stale(start_id, end_id, digests, saved):
+        fresh = store.fresh_features(start_id, end_id, versions)
+        stale = {}
+        for row_id, digest in digests:
+            saved_digest, valid = saved.get(row_id, (None, None))
+            if saved_digest != digest:
+                stale[row_id] = (digest, all_names)
+            elif valid:
+                names = all_names - fresh.get(row_id, frozenset())
+                if names:
+                    stale[row_id] = (digest, names)
+        return stale
+
+    for batch_end_id, rows in stale_batch_generator(store, select_stale, 0, batch_size):
+        for row_id, paper_content_encoded, (digest, names) in rows:
+            pending[row_id] = (digest, names is all_names)
+            yield row_id, paper_content_encoded, names
+
+
+def update_store(store, name, versions, handler, workers=1, chunk_size=64, batch_size=None):
+    """ 按stale_row_generator比对本地库store，由handler在子进程中重新计算，并保存到store。name用于打印进度，返回更新的行数 """
+    commit_rows = batch_size or settings.MysqlParameter.batch_size
+    pending = {}
+    done_rows = 0
+    rows = stale_row_generator(store, versions, pending, batch_size)
+    for row_id, values in row_values_generator(workers, chunk_size, rows, handler):
+        digest, replace_all = pending.pop(row_id)
+        store.save(row_id, digest, values, versions, replace_all)
+        done_rows += 1
+        if done_rows % commit_rows == 0:
+            store.commit()
+            print('{}: {} rows updated'.format(name, done_rows))
+    store.commit()
+    print('{}: {} rows updated'.format(name, done_rows))
+    return done_rows
+
+
+def paper_feature_store(store_path, workers=1, chunk_size=64, batch_size=None):
+    """ 更新本地要素库。须指定要素库文件的路径store_path，要素库的查询见functions.FeatureStore.select """
+    """ 只计算内容有变化的行，以及要素版本（见models.feature）有变化的要素；中断后再次运行，已保存的部分不再计算 """
+    versions = dict((name, version) for name, version in models.TanwuhuiluPaper.feature_versions().items()
+                    if name in STORE_FEATURES)
+    with functions.FeatureStore(store_path) as store:
+        update_store(store, 'feature store', versions, _extract_features, workers, chunk_size, batch_size)
+    return 0
+
+
+# 倒排索引的文书部分，依次为二元组(文本处理器的属性名，段落标签类型)
+INDEX_SECTIONS = (
+    ('first_basic_processor', 2),  # 案件概述
+    ('first_fact_processor', 6),  # 一审法院查明
+    ('first_opinion_processor', 7),  # 一审法院认为
+    ('first_judge_processor', 8),  # 一审裁判结果
+)
+
+
+def _extract_sections(rows):
+    """ 在子进程中执行：解码一批数据行(row_id, 编码的paper_content, 部分名集合)，取出指定部分的文本 """
+    """ 返回(row_id, {部分名: (标签类型, 文本)})的列表，json解码失败的行返回(row_id, None) """
+    labels = dict(INDEX_SECTIONS)
+    results = []
+    for row_id, paper_content_encoded, names in rows:
+        paper_json = functions.PaperContentCoder.decode_json(paper_content_encoded)
+        if paper_json is None:  # json解码失败
+            results.append((row_id, None))
+            continue
+        paper = models.TanwuhuiluPaper(row_id, paper_json)
+        results.append((row_id, dict((name, (labels[name], getattr(paper, name).normalized_text)) for name in names)))
+    return results  # list[tuple(int, dict), ]
+
+
+def paper_text_index(index_path, workers=1, chunk_size=64, batch_size=None):
+    """ 更新本地倒排索引。须指定索引文件的路径index_path，检索见functions.TextIndex.search和search_regex """
+    """ 与要素库相同，只处理内容有变化的行和版本有变化的部分。检索结果可作为row_ids传给MysqlSource，只解析命中的文书，如 """
+    """ paper_export(csv_path, source=functions.MysqlSource(row_ids=index.search('索贿', labels=[7]))) """
+    versions = dict((name, version) for name, version in models.TanwuhuiluPaper.feature_versions().items()
+                    if name in dict(INDEX_SECTIONS))
+    with functions.TextIndex(index_path) as index:
+        update_store(index, 'text index', versions, _extract_sections, workers, chunk_size, batch_size)
+    return 0
+
+
+def paper_opinion_words(jsonl_path, workers=1, batch_texts=1024, cache_file=None, source=None):
+    """ 对各文书一审法院认为部分分词和词性标注，输出到jsonl文件，每行为{"id": paper_id, "words": [[词, 词性], ]} """
+    """ 可指定并行的进程数workers、每批分词的文本数batch_texts、jieba词典缓存文件cache_file和文书来源source """
+    with functions.Segmenter(cache_file, workers) as segmenter, open(jsonl_path, 'wb') as f:
+        paper_ids = deque()  # 已交给分词、尚未写出的paper_id，写出后即弹出，只保留在途的批次
+
+        def opinion_texts():
+            for paper in paper_generator(source=source):
+                paper_ids.append(paper.paper_id)
+                yield paper.first_opinion_processor.clean_text
+
+        for words in segmenter.stream(opinion_texts(), batch_texts):
+            f.write(ujson.dumps({'id': paper_ids.popleft(), 'words': words}, ensure_ascii=False).encode('utf-8') + b'\n')
+    return 0
+
+
+def get_samples(file_path, num=385, seed=None, replace=True, stratify_by=None, valid_only=False):
+    """ 获取抽样样本的paper_id。必须指定输出文件的路径；可指定抽样数量，默认为385 """
+    # 在本地抽样：从数据库读取全部tag为0的id（不分层时可走(tag, id)索引；分层列不在该索引中），不解码文书内容
+    # 因此默认不排除paper_content不是合法json的行；valid_only为True时与原实现相同排除这些行，但须解码全部文书内容
+    # seed: 随机种子；replace: 是否有放回；stratify_by: 分层抽样的列，'province'、'court'或'cause'
+    if stratify_by not in (None, 'province', 'court', 'cause'):
+        raise ValueError('stratify_by must be None, province, court or cause')
     print('Creating paper_ids Samples...')
-    for _paper in paper_generator():
-        paper_ids.append(_paper.paper_id)
-        if _paper.paper_id % 10 == 0:  # 进度显示，以10为单位
-            print(_paper.paper_id)
+    select_sql = 'select id{0} from {1} where tag = 0'.format(
+        ', ' + stratify_by if stratify_by else '', settings.MysqlParameter.used_table
+    )
+    skip_row_ids = set(settings.MysqlParameter.skip_row_ids)
+    with functions.MysqlConnector() as mc:
+        mc.cursor.execute(select_sql)
+        result = [row for row in mc.cursor.fetchall() if row[0] not in skip_row_ids]
+    if valid_only:
+        valid_ids = set(row_id for row_id, paper_content_encoded in row_generator()
+                        if functions.PaperContentCoder.decode_json(paper_content_encoded) is not None)
+        result = [row for row in result if row[0] in valid_ids]
+    paper_ids = [row[0] for row in result]
+    strata = [row[1] for row in result] if stratify_by else None
     print('Created paper_ids Samples')
-    functions.Samples(paper_ids, num).export_result(file_path)
+    functions.Samples(paper_ids, num, seed, replace, strata).export_result(file_path)
     return 0
 
 
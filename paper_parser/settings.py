@@ -17,6 +17,10 @@ class MysqlParameter:
         'cause', 'trial_level', 'paper_type', 'paper_content', 'tag'
     )
     skip_row_ids = ()
+    batch_size = 1000  # 分批读取时每批的行数
+    prefetch_batches = 2  # 后台线程预取的批数，0表示不预取
+    pool_size = 4  # 每个用户的连接池大小
+    pool_ping_interval = 30  # 空闲超过该秒数的连接，复用前先ping检查
 
 
 PROVINCE_DICT = {
@@ -66,9 +70,32 @@ JOB_TYPE_DICT = {
 }
 
 
+# 法院意见中的情节关键词。正则表达式已展开为等价的字符串集合，供functions.KeywordMatcher一次扫描找出全部命中
+OPINION_KEYWORDS = {  # 在消除辩护意见后的一审法院意见中查找
+    'leifan': ('累犯', ),
+    'ligong': ('立功', ),
+    'zishou': ('自首', ),
+    'tanbai': ('坦白', '认罪', '如实供述', '交代', '配合', ),
+}
+OPINION_PREFIX_KEYWORDS = {  # 在截至'辩护'的一审法院意见中查找
+    'bad_effect': ('社会影响', '恶劣影响', '恶劣的影响', '影响恶劣', '重大损失', '重大的损失', '遭受损失', ),
+    'tuizang': ('退', ),  # 退回 退赃 退缴 退清 退出 退交 退还 退赔 退完
+    'punished_by_party_admin': ('过党纪', '被党纪', '过行政', '被行政', '党纪行政', '党纪、行政', ),
+    'punished_by_criminal_law': ('曾因犯', '被判', '过刑事', '被刑事', '前科', '因故意犯罪', ),
+    'special_money': (
+        '特定款物', '特定款项', '救灾', '抢险', '防汛', '优抚', '扶贫', '移民', '救济', '防疫', '社会捐助',
+    ),
+    'suohui': ('索贿', ),
+    'seek_promote': ('提拔', ),
+}
+
+
 # 正则表达式
 pattern_money = re.compile(r'\d[0-9,.]*[万亿]?余?元|[零一壹二两贰三叁四肆五伍六陆七柒八捌九玖十拾百佰千仟万亿]+余?元')
-pattern_date = re.compile(r'\d{4}年\d{1,2}月\d{1,2}日')
+# pattern_money的镜像，用于在倒序的文本中从'元'开始匹配，修改pattern_money时须同步修改
+pattern_money_reversed = re.compile(r'元余?(?:[万亿]?[0-9,.]*\d|[零一壹二两贰三叁四肆五伍六陆七柒八捌九玖十拾百佰千仟万亿]+)')
+pattern_date = re.compile(r'(\d{4})年(\d{1,2})月(\d{1,2})日')  # 分组依次为年、月、日
+pattern_iso_date = re.compile(r'([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})')  # 与strptime的'%Y-%m-%d'接受的形式相同
 pattern_delete_bracket_contents = re.compile(r'（.*?）')
 pattern_sentences = re.compile(r'[。！？]')
 pattern_crime_law_version = re.compile(r'刑法（(\d{4})修正）')
@@ -82,7 +109,7 @@ pattern_defendant = {
     'educated': (re.compile(r'，([\u4e00-\u9fff]+?)文化'), re.compile(r'文化程度([\u4e00-\u9fff]+?)[，。]', )),
     'job': re.compile(r'(?<![主责])[任系原]+([\u4e00-\u9fff].+?)[，。、]')
 }
-pattern_tanbai = re.compile(r'坦白|认罪|如实供述|交代|配合')
+pattern_tanbai = re.compile('|'.join(OPINION_KEYWORDS['tanbai']))
 pattern_gongfan = {
     'no_zhucong': re.compile(r'不宜?区分主、?从犯?'), 'zhucong': re.compile(r'[^不][系是属为]本?案?([主从])犯')
 }
@@ -112,10 +139,10 @@ pattern_job_info = {
     'job_grade': None
 }
 pattern_money_usage = re.compile(r'用于([\u4e00-\u9fff0]+?)[的是，。；]')
-pattern_punished_by_party_admin = re.compile(r'[过被]党纪|[过被]行政|党纪、?行政')
-pattern_punished_by_criminal_law = re.compile(r'曾因犯|被判|[过被]刑事|前科|因故意犯罪')
-pattern_bad_effect = re.compile(r'社会影响|恶劣的?影响|影响恶劣|重大的?损失|遭受损失')
-pattern_special_money = re.compile(r'特定款[物项]|救灾|抢险|防汛|优抚|扶贫|移民|救济|防疫|社会捐助')
+pattern_punished_by_party_admin = re.compile('|'.join(OPINION_PREFIX_KEYWORDS['punished_by_party_admin']))
+pattern_punished_by_criminal_law = re.compile('|'.join(OPINION_PREFIX_KEYWORDS['punished_by_criminal_law']))
+pattern_bad_effect = re.compile('|'.join(OPINION_PREFIX_KEYWORDS['bad_effect']))
+pattern_special_money = re.compile('|'.join(OPINION_PREFIX_KEYWORDS['special_money']))
 
 # html template
 html_template_head = """<!DOCTYPE html>
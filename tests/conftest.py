@@ -0,0 +1,103 @@
+# -*- coding:utf-8 -*-
+
+
+import os
+import sys
+
+# 从仓库根目录导入paper_parser，不需要安装
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+import hashlib
+import sqlite3
+import pymysql
+import pytest
+from paper_parser import functions
+from paper_parser import settings
+
+
+class FakeCursor:
+    """ 以sqlite执行的pymysql游标，只支持本项目用到的%s占位符、NULL安全的<=>和fetch方法 """
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, args=None):
+        cursor = self.db.execute(sql.replace('%s', '?').replace('<=>', 'is'), tuple(args or ()))
+        self.rows = cursor.fetchall()
+        return len(self.rows) if cursor.description else cursor.rowcount  # update等语句返回影响的行数
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return tuple(rows)
+
+    def __iter__(self):
+        while self.rows:
+            yield self.rows.pop(0)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FakeConnection:
+    """ 以sqlite文件代替MariaDB的pymysql连接，提供md5函数 """
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)  # 预取在后台线程中读取
+        self.db.create_function('md5', 1, lambda value: None if value is None else hashlib.md5(
+            value.encode() if isinstance(value, str) else value).hexdigest())
+        self.pings = 0
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.db)
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+class FakeTable:
+    """ 测试用的数据表，列为id、paper_content、tag和分层抽样用的province """
+
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(path) as db:
+            db.execute('create table {0} (id integer primary key, paper_content text, tag integer, province text)'.format(
+                settings.MysqlParameter.used_table))
+
+    def execute(self, sql, args=()):
+        with sqlite3.connect(self.path) as db:
+            db.execute(sql.format(table=settings.MysqlParameter.used_table), args)
+
+    def put(self, row_id, paper_content, tag=0, province=None):
+        self.execute('insert or replace into {table} values (?, ?, ?, ?)', (row_id, paper_content, tag, province))
+
+    def delete(self, row_id):
+        self.execute('delete from {table} where id = ?', (row_id, ))
+
+
+@pytest.fixture
+def fake_table(tmp_path, monkeypatch):
+    """ 把pymysql.connect换成sqlite数据表，并清空已创建的连接池 """
+    table = FakeTable(str(tmp_path / 'table.sqlite'))
+    monkeypatch.setattr(pymysql, 'connect', lambda **kwargs: FakeConnection(table.path))
+    monkeypatch.setattr(functions, '_pools', {})
+    return table
@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+
+
+import pytest
+from paper_parser import functions
+from paper_parser import models
+from paper_parser import parser
+
+
+def run(checkpoint_path, batch_size=2, signature='v1', fail_after=None):
+    """ 增量处理一轮：结果为内容的大写，内容为'bad'的行视为解码失败没有结果。返回本轮处理的row_id """
+    done = []
+
+    def results(rows):
+        for row_id, paper_content in rows:
+            if fail_after is not None and len(done) == fail_after:
+                raise KeyboardInterrupt
+            done.append(row_id)
+            if paper_content != 'bad':
+                yield row_id, paper_content.upper().encode()
+
+    with functions.Checkpoint(checkpoint_path, signature) as checkpoint:
+        rows = parser.changed_row_generator(checkpoint, batch_size)
+        parser.save_results(checkpoint, results(rows), batch_size, 'test')
+    return done
+
+
+def saved(checkpoint_path):
+    with functions.Checkpoint(checkpoint_path, 'v1') as checkpoint:
+        return list(checkpoint.items())
+
+
+def test_only_changed_rows_are_processed(fake_table, tmp_path):
+    checkpoint_path = str(tmp_path / 'checkpoint.sqlite')
+    for row_id in range(1, 6):
+        fake_table.put(row_id, 'p{}'.format(row_id))
+    fake_table.put(6, 'bad')
+    assert run(checkpoint_path) == [1, 2, 3, 4, 5, 6]
+    assert saved(checkpoint_path) == [(row_id, 'P{}'.format(row_id).encode()) for row_id in range(1, 6)]
+    assert run(checkpoint_path) == []  # 解码失败的行内容不变时同样跳过
+
+    fake_table.put(2, 'changed')
+    fake_table.put(7, 'p7')
+    fake_table.put(4, 'p4', tag=1)  # tag改为非0
+    fake_table.delete(5)
+    assert run(checkpoint_path) == [2, 7]
+    assert saved(checkpoint_path) == [(1, b'P1'), (2, b'CHANGED'), (3, b'P3'), (7, b'P7')]
+
+
+def test_resume_after_interruption(fake_table, tmp_path):
+    checkpoint_path = str(tmp_path / 'checkpoint.sqlite')
+    for row_id in range(1, 10):
+        fake_table.put(row_id, 'p{}'.format(row_id))
+    with pytest.raises(KeyboardInterrupt):
+        run(checkpoint_path, fail_after=5)
+    with functions.Checkpoint(checkpoint_path, 'v1') as checkpoint:
+        assert checkpoint.get_meta('complete') == '0'
+        last_id = int(checkpoint.get_meta('last_id'))
+    assert 0 < last_id <= 5
+    assert run(checkpoint_path) == [6, 7, 8, 9]  # 从检查点记录的id继续，中断前已保存的行不再处理
+    assert saved(checkpoint_path) == [(row_id, 'P{}'.format(row_id).encode()) for row_id in range(1, 10)]
+    assert run(checkpoint_path) == []
+
+
+def test_signature_change_discards_results(fake_table, tmp_path):
+    checkpoint_path = str(tmp_path / 'checkpoint.sqlite')
+    for row_id in range(1, 4):
+        fake_table.put(row_id, 'p{}'.format(row_id))
+    assert run(checkpoint_path) == [1, 2, 3]
+    assert run(checkpoint_path, signature='v2') == [1, 2, 3]
+
+
+def test_export_signature_follows_feature_versions():
+    versions = models.TanwuhuiluPaper.feature_versions()
+    assert parser.export_signature() == parser.export_signature(versions)
+    assert parser.export_signature(dict(versions, cause='changed')) != parser.export_signature(versions)
+    assert parser.export_signature(dict(versions, unexported='changed')) == parser.export_signature(versions)
+
+
+def test_render_version_follows_template_and_features(monkeypatch):
+    from paper_parser import settings
+
+    class Changed(models.TanwuhuiluPaper):
+        @models.feature('json', version=2)
+        def court(self):
+            return self.json['court']
+
+    version = models.TanwuhuiluPaper.render_version()
+    assert Changed.render_version() != version
+    monkeypatch.setattr(settings, 'html_template_tail', '</html>\n')
+    assert models.TanwuhuiluPaper.render_version() != version
@@ -0,0 +1,122 @@
+# -*- coding:utf-8 -*-
+
+
+import os
+import threading
+import pymysql
+import pytest
+from paper_parser import functions
+
+
+class Cursor:
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self):
+        self.pings = 0
+        self.closed = False
+        self.broken = False
+
+    def cursor(self, cursor_class=None):
+        return Cursor()
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+
+    def rollback(self):
+        if self.broken:
+            raise pymysql.err.OperationalError(2006, 'MySQL server has gone away')
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """ 记录pymysql.connect打开的连接 """
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(Connection())
+        return opened[-1]
+
+    monkeypatch.setattr(pymysql, 'connect', connect)
+    monkeypatch.setattr(functions, '_pools', {})
+    return opened
+
+
+def test_idle_connections_are_reused(connections):
+    pool = functions.ConnectionPool(1, size=2, ping_interval=3600)
+    db = pool.acquire()
+    pool.release(db)
+    assert pool.acquire() is db
+    assert len(connections) == 1
+    assert db.pings == 0  # 刚归还的连接不检查
+
+
+def test_stale_connections_are_pinged(connections):
+    pool = functions.ConnectionPool(1, size=2, ping_interval=0)
+    db = pool.acquire()
+    pool.release(db)
+    assert pool.acquire() is db
+    assert db.pings == 1
+
+
+def test_broken_connection_is_discarded(connections):
+    pool = functions.ConnectionPool(1, size=1, ping_interval=3600)
+    db = pool.acquire()
+    db.broken = True
+    pool.release(db)
+    assert db.closed
+    assert pool.opened == 0
+    assert pool.acquire() is not db
+
+
+def test_failed_connect_frees_the_slot(monkeypatch):
+    def connect(**kwargs):
+        raise pymysql.err.OperationalError(2003, "Can't connect")
+
+    monkeypatch.setattr(pymysql, 'connect', connect)
+    pool = functions.ConnectionPool(1, size=1)
+    for i in range(2):
+        with pytest.raises(pymysql.err.OperationalError):
+            pool.acquire()
+    assert pool.opened == 0
+
+
+def test_acquire_waits_when_pool_is_full(connections):
+    pool = functions.ConnectionPool(1, size=1, ping_interval=3600)
+    db = pool.acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive() and not acquired
+    pool.release(db)
+    waiter.join(5)
+    assert acquired == [db]
+    assert len(connections) == 1
+
+
+def test_new_pool_after_fork(connections, monkeypatch):
+    pool = functions.get_pool(1)
+    assert functions.get_pool(1) is pool
+    assert functions.get_pool(0) is not pool
+    monkeypatch.setattr(os, 'getpid', lambda: pool.pid + 1)  # 模拟fork出的子进程
+    child_pool = functions.get_pool(1)
+    assert child_pool is not pool
+    assert child_pool.pid == pool.pid + 1
+
+
+def test_connector_returns_or_discards(connections):
+    with functions.MysqlConnector() as mc:
+        db = mc.db
+    assert functions.get_pool(1).idle[0][0] is db
+    with pytest.raises(ValueError):
+        with functions.MysqlConnector() as mc:
+            assert mc.db is db
+            raise ValueError
+    assert db.closed  # 出错时不再复用
+    assert functions.get_pool(1).idle == []
@@ -0,0 +1,57 @@
+# -*- coding:utf-8 -*-
+
+
+import random
+from datetime import datetime
+import numpy as np
+from paper_parser import functions
+from paper_parser import settings
+
+
+def strptime_or_error(date_string, date_format):
+    try:
+        return datetime.strptime(date_string, date_format)
+    except ValueError:
+        return ValueError
+
+
+def test_parse_date_equals_strptime():
+    rng = random.Random(1)
+    chars = '0123456789-- 0１T'
+    date_strings = [''.join(rng.choice(chars) for i in range(rng.randint(0, 12))) for j in range(50000)]
+    date_strings += ['{0}-{1}-{2}'.format(rng.randint(0, 10000), rng.randint(0, 13), rng.randint(0, 32))
+                     for j in range(50000)]
+    date_strings += ['2017-02-28', '2016-02-29', '2017-02-29', '2017-2-3', '02017-01-01', '2017-001-01', ' 2017-01-01']
+    for date_string in date_strings:
+        expected = strptime_or_error(date_string, '%Y-%m-%d')
+        try:
+            result = functions.parse_date(date_string)
+        except ValueError:
+            result = ValueError
+        assert result == expected, date_string
+
+
+def test_extract_dates_equal_strptime():
+    rng = random.Random(2)
+    texts = []
+    for j in range(20000):
+        texts.append('于{0}年{1}月{2}日，{3}年{4}月{5}日'.format(
+            rng.randint(0, 9999), rng.randint(0, 13), rng.randint(0, 32),
+            rng.choice(['2017', '17', '20170']), rng.choice(['1', '01', '001', '0']), rng.choice(['1', '31', '030'])
+        ))
+    for text in texts:
+        processor = functions.TextProcessor(text)
+        # 改写前的实现：findall后逐个strptime，跳过无法解析的日期
+        expected = tuple(date for date in (
+            strptime_or_error(date_string, '%Y年%m月%d日')
+            for date_string in (match.group() for match in settings.pattern_date.finditer(processor.clean_text))
+        ) if date is not ValueError)
+        assert processor.extract_dates() == expected, text
+
+
+def test_parse_dates():
+    days = functions.parse_dates(['2017-03-01', None, '', 'bad', datetime(2016, 2, 29, 12), '2017-02-30'])
+    assert days.dtype == np.dtype('datetime64[D]')
+    assert days[0] == np.datetime64('2017-03-01')
+    assert days[4] == np.datetime64('2016-02-29')
+    assert np.isnat(days[[1, 2, 3, 5]]).all()
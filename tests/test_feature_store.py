@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+
+
+from datetime import datetime
+from paper_parser import functions
+from paper_parser import parser
+
+
+def test_values_round_trip(tmp_path):
+    values = {
+        'cause': '受贿罪', 'penalty': {'freedom': 12, 'property': -1.0}, 'judges': ('张三', '李四'),
+        'judge_date': datetime(2017, 3, 1), 'dates': [datetime(2016, 1, 2)], 'accept_fee': None,
+    }
+    versions = dict((name, 'v1') for name in values)
+    with functions.FeatureStore(str(tmp_path / 'store.sqlite')) as store:
+        store.save(1, 'd1', values, versions, True)
+        store.save(2, 'd2', dict(values, cause='贪污罪'), versions, True)
+        store.save(3, 'd3', None, versions, True)  # 解码失败的行不出现在查询结果中
+        names = sorted(values)
+        (row, ) = list(store.select(names, cause='受贿罪'))
+        assert row[0] == 1
+        loaded = dict(zip(names, row[1:]))
+        assert loaded == dict(values, judges=['张三', '李四'])  # 元组读出为列表
+        assert [row_id for row_id, cause in store.select(['cause'], judge_date=('like', '2017%'))] == [1, 2]
+        assert [row_id for row_id, cause in store.select(['cause'], cause=('<>', '受贿罪'))] == [2]
+
+
+def test_digests_versions_and_deletion(tmp_path):
+    versions = {'a': 'v1', 'b': 'v1'}
+    with functions.FeatureStore(str(tmp_path / 'store.sqlite')) as store:
+        store.save(1, 'd1', {'a': 1, 'b': 2}, versions, True)
+        store.save(2, 'd2', {'a': 1, 'b': 2}, versions, True)
+        store.save(3, 'd3', None, versions, True)
+        assert store.digests(0, None) == {1: ('d1', 1), 2: ('d2', 1), 3: ('d3', 0)}
+        assert store.digests(1, 2) == {2: ('d2', 1)}
+        assert store.fresh_features(0, None, {'a': 'v1', 'b': 'v2'}) == {1: {'a'}, 2: {'a'}}
+        store.save(2, 'd2', {'b': 3}, {'b': 'v2'}, False)  # 内容未变时只替换版本有变化的要素
+        assert list(store.select(['a', 'b'])) == [(1, 1, 2), (2, 1, 3)]
+        store.delete_missing(0, None, [2])
+        assert store.digests(0, None) == {2: ('d2', 1)}
+        assert list(store.select(['a'])) == [(2, 1)]
+
+
+def test_stale_rows(fake_table, tmp_path):
+    for row_id in range(1, 5):
+        fake_table.put(row_id, 'p{}'.format(row_id))
+    versions = {'a': 'v1', 'b': 'v1'}
+    all_names = frozenset(versions)
+
+    def update(versions):
+        pending = {}
+        rows = list(parser.stale_row_generator(store, versions, pending, batch_size=3))
+        for row_id, paper_content, names in rows:
+            digest, replace_all = pending.pop(row_id)
+            values = None if paper_content == 'bad' else dict((name, paper_content) for name in names)
+            store.save(row_id, digest, values, versions, replace_all)
+        return dict((row_id, names) for row_id, paper_content, names in rows)
+
+    with functions.FeatureStore(str(tmp_path / 'store.sqlite')) as store:
+        assert update(versions) == dict((row_id, all_names) for row_id in range(1, 5))
+        assert update(versions) == {}
+        fake_table.put(2, 'bad')
+        fake_table.delete(3)
+        assert update(versions) == {2: all_names}
+        assert update(dict(versions, b='v2')) == {1: {'b'}, 4: {'b'}}  # 解码失败的行不因版本变化重算
+        assert list(store.select(['a', 'b'])) == [(1, 'p1', 'p1'), (4, 'p4', 'p4')]
+
+
+def test_feature_versions_follow_dependencies():
+    from paper_parser import models
+
+    class Base(models.Paper):
+        @models.feature('paper_content')
+        def text(self):
+            return self.paper_content
+
+        @models.feature('text')
+        def length(self):
+            return len(self.text)
+
+    class Changed(Base):
+        @models.feature('paper_content', version=2)
+        def text(self):
+            return self.paper_content.strip()
+
+    base, changed = Base.feature_versions(), Changed.feature_versions()
+    assert base['text'] != changed['text']
+    assert base['length'] != changed['length']  # 依赖的要素版本变化，依赖方的有效版本随之变化
@@ -0,0 +1,69 @@
+# -*- coding:utf-8 -*-
+
+
+import random
+import re
+from paper_parser import functions
+from paper_parser import settings
+
+# 改写前（逐个要素扫描文本）使用的正则表达式和关键词，KeywordMatcher的命中须与之一致
+BASELINE_OPINION = {
+    'leifan': re.compile('累犯'),
+    'ligong': re.compile('立功'),
+    'zishou': re.compile('自首'),
+    'tanbai': re.compile(r'坦白|认罪|如实供述|交代|配合'),
+}
+BASELINE_OPINION_PREFIX = {
+    'bad_effect': re.compile(r'社会影响|恶劣的?影响|影响恶劣|重大的?损失|遭受损失'),
+    'tuizang': re.compile('退'),
+    'punished_by_party_admin': re.compile(r'[过被]党纪|[过被]行政|党纪、?行政'),
+    'punished_by_criminal_law': re.compile(r'曾因犯|被判|[过被]刑事|前科|因故意犯罪'),
+    'special_money': re.compile(r'特定款[物项]|救灾|抢险|防汛|优抚|扶贫|移民|救济|防疫|社会捐助'),
+    'suohui': re.compile('索贿'),
+    'seek_promote': re.compile('提拔'),
+}
+
+
+def random_texts(keyword_dict, num, seed):
+    """ 由关键词的片段和干扰字拼成的随机文本，覆盖关键词重叠、相连和被截断的情况 """
+    rng = random.Random(seed)
+    pieces = [k for group in keyword_dict.values() for k in group]
+    pieces += [k[:i] for k in pieces for i in range(1, len(k))] + list('，。的被过因、辩护人认为')
+    return [''.join(rng.choice(pieces) for i in range(rng.randint(0, 12))) for j in range(num)]
+
+
+def baseline_hits(patterns, text):
+    return frozenset(name for name, pattern in patterns.items() if pattern.search(text))
+
+
+def test_opinion_hits_match_baseline_patterns():
+    matcher = functions.KeywordMatcher(settings.OPINION_KEYWORDS)
+    for text in random_texts(settings.OPINION_KEYWORDS, 20000, 7):
+        assert matcher.hits(text) == baseline_hits(BASELINE_OPINION, text), text
+
+
+def test_opinion_prefix_hits_match_baseline_patterns():
+    matcher = functions.KeywordMatcher(settings.OPINION_PREFIX_KEYWORDS)
+    for text in random_texts(settings.OPINION_PREFIX_KEYWORDS, 20000, 11):
+        assert matcher.hits(text) == baseline_hits(BASELINE_OPINION_PREFIX, text), text
+
+
+def test_settings_patterns_match_baseline():
+    pairs = [
+        (settings.pattern_tanbai, BASELINE_OPINION['tanbai']),
+        (settings.pattern_bad_effect, BASELINE_OPINION_PREFIX['bad_effect']),
+        (settings.pattern_punished_by_party_admin, BASELINE_OPINION_PREFIX['punished_by_party_admin']),
+        (settings.pattern_punished_by_criminal_law, BASELINE_OPINION_PREFIX['punished_by_criminal_law']),
+        (settings.pattern_special_money, BASELINE_OPINION_PREFIX['special_money']),
+    ]
+    texts = random_texts(settings.OPINION_PREFIX_KEYWORDS, 5000, 13) + random_texts(settings.OPINION_KEYWORDS, 5000, 17)
+    for pattern, baseline in pairs:
+        for text in texts:
+            assert bool(pattern.search(text)) == bool(baseline.search(text)), (pattern.pattern, text)
+
+
+def test_overlapping_keywords():
+    matcher = functions.KeywordMatcher({'short': ('恶劣', ), 'long': ('恶劣影响', ), 'other': ('影响', )})
+    assert matcher.hits('恶劣影响') == frozenset(['short', 'long', 'other'])
+    assert matcher.hits('') == frozenset()
+    assert matcher.hits(None) == frozenset()
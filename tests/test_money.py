@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+
+
+import random
+import numpy as np
+import pytest
+from paper_parser import functions
+from paper_parser import settings
+
+MONEY_CHARS = '0123456789,.万亿余元零一壹二两贰三叁四肆五伍六陆七柒八捌九玖十拾百佰千仟'
+
+
+def random_texts(num, seed):
+    """ 金额字符与干扰字混合的随机文本，覆盖相邻、嵌套和不完整的金额 """
+    rng = random.Random(seed)
+    chars = MONEY_CHARS + '受贿人民币共计，。的'
+    return [''.join(rng.choice(chars) for i in range(rng.randint(0, 20))) for j in range(num)]
+
+
+def test_money_matches_equal_forward_pattern():
+    for text in random_texts(50000, 3):
+        expected = [(match.group(), match.start(), match.end()) for match in settings.pattern_money.finditer(text)]
+        assert functions.money_matches(text) == expected, text
+
+
+@pytest.mark.parametrize('money_str, amount', [
+    ('一万三千元', 1.3), ('1.3万元', 1.3), ('5,000元', 0.5), ('三千余元', 0.3), ('10亿元', 100000.0),
+    ('二十元', 0.002), ('壹佰元', 0.01), ('1.2.3元', None),
+])
+def test_money2num(money_str, amount):
+    assert functions.money2num(money_str) == amount
+
+
+def test_extract_moneys_equal_baseline_and_batch():
+    texts = random_texts(3000, 5) + ['收受人民币十万元，另收受5，000元。', '', None]
+    amounts, spans, offsets = functions.TextProcessor.extract_moneys_batch(texts)
+    assert len(offsets) == len(texts) + 1
+    assert spans.shape == (len(amounts), 2)
+    for i, text in enumerate(texts):
+        processor = functions.TextProcessor(text)
+        moneys = processor.extract_moneys()
+        # 改写前的实现：对整段文本findall后逐个转换
+        clean_text = processor.clean_text.replace('，', ',').replace('。', '.')
+        baseline = tuple(amount for amount in map(functions.money2num, settings.pattern_money.findall(clean_text))
+                         if amount is not None)
+        assert moneys == baseline, text
+        assert tuple(amounts[offsets[i]:offsets[i + 1]].tolist()) == moneys
+        for (start, end), amount in zip(spans[offsets[i]:offsets[i + 1]].tolist(), moneys):
+            assert functions.money2num(clean_text[start:end]) == amount
+    i = len(texts) - 3
+    assert np.allclose(amounts[offsets[i]:offsets[i + 1]], [10.0, 0.5])
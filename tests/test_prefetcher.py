@@ -0,0 +1,52 @@
+# -*- coding:utf-8 -*-
+
+
+import threading
+import pytest
+from paper_parser import functions
+
+
+def test_batches_in_order():
+    batches = [[i, i + 1] for i in range(0, 20, 2)]
+    prefetcher = functions.Prefetcher(iter(batches), 2)
+    assert list(prefetcher) == batches
+    stats = prefetcher.stats()
+    assert stats['batches'] == 10
+    assert stats['max_depth'] <= 2
+    assert stats['bound'] in ('db', 'cpu')
+
+
+def test_empty_source():
+    prefetcher = functions.Prefetcher(iter([]), 2)
+    assert list(prefetcher) == []
+    assert prefetcher.stats()['batches'] == 0
+
+
+def test_error_is_raised_in_consumer():
+    def batches():
+        yield [1]
+        raise RuntimeError('connection lost')
+
+    prefetcher = functions.Prefetcher(batches(), 2)
+    iterator = iter(prefetcher)
+    assert next(iterator) == [1]
+    with pytest.raises(RuntimeError, match='connection lost'):
+        next(iterator)
+
+
+def test_early_stop_closes_source():
+    closed = threading.Event()
+
+    def batches():
+        try:
+            for i in range(1000):
+                yield [i]
+        finally:
+            closed.set()
+
+    prefetcher = functions.Prefetcher(batches(), 1)
+    iterator = iter(prefetcher)
+    assert [next(iterator) for i in range(3)] == [[0], [1], [2]]
+    iterator.close()  # 主线程提前结束时，后台线程退出并关闭数据来源
+    assert prefetcher.stopped.is_set()
+    assert closed.wait(5)
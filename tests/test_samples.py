@@ -0,0 +1,31 @@
+# -*- coding:utf-8 -*-
+
+
+import pytest
+from paper_parser import functions
+
+
+UNIVERSE = list(range(1, 11))
+STRATA = ['a'] * 7 + ['b'] * 3
+
+
+@pytest.mark.parametrize('strata', [None, STRATA])
+def test_without_replacement_takes_distinct_rows(strata):
+    samples = functions.Samples(UNIVERSE, 10, seed=1, replace=False, strata=strata).choice()
+    assert sorted(samples) == UNIVERSE
+
+
+@pytest.mark.parametrize('strata', [None, STRATA])
+def test_too_many_samples_without_replacement(strata):
+    with pytest.raises(ValueError):
+        functions.Samples(UNIVERSE, 11, seed=1, replace=False, strata=strata)
+    assert len(functions.Samples(UNIVERSE, 11, seed=1, strata=strata).choice()) == 11
+
+
+def test_allocate_is_proportional():
+    assert functions.Samples(UNIVERSE, 5, strata=STRATA).allocate() == {'a': 4, 'b': 1}
+    assert functions.Samples(UNIVERSE, 4, replace=False, strata=STRATA).allocate() == {'a': 3, 'b': 1}
+
+
+def test_empty_universe():
+    assert functions.Samples([], 5, replace=False).choice() == ()
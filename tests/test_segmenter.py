@@ -0,0 +1,71 @@
+# -*- coding:utf-8 -*-
+
+
+import jieba.posseg as pseg
+import pytest
+from paper_parser import functions
+
+TEXTS = ['本院认为，被告人受贿', '被告人如实供述', '判处有期徒刑三年', '没收财产人民币十万元', '本院认为，被告人受贿']
+
+
+def expected(text):
+    return tuple((pair.word, pair.flag) for pair in pseg.cut(text))
+
+
+@pytest.fixture
+def segment_calls(monkeypatch):
+    """ 记录每次实际分词的文本 """
+    calls = []
+    segment_texts = functions._segment_texts
+
+    def counting(texts):
+        calls.append(list(texts))
+        return segment_texts(texts)
+
+    monkeypatch.setattr(functions, '_segment_texts', counting)
+    return calls
+
+
+def test_batch_equals_jieba_and_dedups(segment_calls):
+    segmenter = functions.Segmenter(cache_size=100)
+    assert segmenter.cut_batch(TEXTS) == [expected(text) for text in TEXTS]
+    assert segment_calls == [TEXTS[:4]]  # 同一批中重复的文本只分词一次
+    assert segmenter.cut_batch(TEXTS[:2]) == [expected(text) for text in TEXTS[:2]]
+    assert segment_calls == [TEXTS[:4], []]
+
+
+def test_batch_larger_than_cache(segment_calls):
+    segmenter = functions.Segmenter(cache_size=2)
+    segmenter.cut(TEXTS[0])
+    # 本批不同的文本多于cache_size，之前命中的结果会在保存新结果时被淘汰
+    assert segmenter.cut_batch(TEXTS) == [expected(text) for text in TEXTS]
+    assert len(segmenter.cache) == 2
+
+
+def test_cut_uses_lru_cache(segment_calls):
+    segmenter = functions.Segmenter(cache_size=2)
+    for text in (TEXTS[0], TEXTS[1], TEXTS[0], TEXTS[2], TEXTS[0]):
+        assert segmenter.cut(text) == expected(text)
+    assert len(segment_calls) == 3  # TEXTS[0]最近使用过，未被淘汰
+
+
+def test_stream_keeps_order():
+    segmenter = functions.Segmenter(cache_size=3)
+    texts = TEXTS * 3
+    assert list(segmenter.stream(iter(texts), batch_texts=4)) == [expected(text) for text in texts]
+
+
+def test_pooled_batches_equal_serial():
+    texts = ['第{}段：被告人收受他人财物'.format(i) for i in range(20)]
+    with functions.Segmenter(workers=2, chunk_size=4) as segmenter:
+        assert segmenter.pool is not None
+        assert segmenter.cut_batch(texts) == [expected(text) for text in texts]
+    assert segmenter.pool is None
+
+
+def test_shared_segmenter_is_lazy_and_bounded(monkeypatch):
+    monkeypatch.setattr(functions, '_segmenter', None)
+    segmenter = functions.get_segmenter()
+    assert functions.get_segmenter() is segmenter
+    assert segmenter.cache_size == functions.Segmenter.SHARED_CACHE_SIZE
+    assert functions.TextProcessor(TEXTS[0]).word_flags == expected(TEXTS[0])
@@ -0,0 +1,27 @@
+# -*- coding:utf-8 -*-
+
+
+import base64
+import zlib
+import pytest
+from paper_parser import functions
+
+
+def encoded(json_bytes):
+    return base64.b64encode(zlib.compress(json_bytes)).decode()
+
+
+@pytest.mark.parametrize('raw', [False, True])
+def test_snapshot_round_trip(tmp_path, raw):
+    snapshot_path = str(tmp_path / 'snapshot.jsonl.gz')
+    rows = [
+        (1, encoded('{\n  "title": "第一行\\n第二行",\n  "court": "法院"\n}'.encode('utf-8'))),  # 格式化输出的json含换行
+        (2, encoded(b'{not json')),
+        (3, {'title': 'dict'}),
+    ]
+    with functions.JsonlSnapshot(snapshot_path, raw=raw) as snapshot:
+        for row_id, paper_content in rows:
+            snapshot.write(row_id, paper_content)
+    decoded = [(row_id, functions.PaperContentCoder.decode_json(paper_content))
+               for row_id, paper_content in functions.JsonlSource(snapshot_path)]
+    assert decoded == [(1, {'title': '第一行\n第二行', 'court': '法院'}), (2, None), (3, {'title': 'dict'})]
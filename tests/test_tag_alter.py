@@ -0,0 +1,28 @@
+# -*- coding:utf-8 -*-
+
+
+import sqlite3
+from paper_parser import functions
+from paper_parser import settings
+
+
+def tags(fake_table):
+    with sqlite3.connect(fake_table.path) as db:
+        return dict(db.execute('select id, tag from {}'.format(settings.MysqlParameter.used_table)))
+
+
+def test_alter_ids_includes_null_tags(fake_table):
+    fake_table.put(1, 'p1', tag=0)
+    fake_table.put(2, 'p2', tag=None)
+    fake_table.put(3, 'p3', tag=1)
+    assert functions.TagAlter([1, 2, 3], 1, chunk_size=2).alter() == {'requested': 3, 'changed': 2}
+    assert tags(fake_table) == {1: 1, 2: 1, 3: 1}
+
+
+def test_alter_where_includes_null_tags(fake_table):
+    for row_id in range(1, 6):
+        fake_table.put(row_id, 'p{}'.format(row_id), tag=None if row_id % 2 else 0)
+    assert functions.TagAlter(None, 0, chunk_size=2).alter_range(1, 5) == {'requested': 5, 'changed': 3}
+    assert tags(fake_table) == dict((row_id, 0) for row_id in range(1, 6))
+    assert functions.TagAlter(None, None).alter_where('id > %s', (3, )) == {'requested': None, 'changed': 2}
+    assert tags(fake_table) == {1: 0, 2: 0, 3: 0, 4: None, 5: None}
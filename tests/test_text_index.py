@@ -0,0 +1,118 @@
+# -*- coding:utf-8 -*-
+
+
+import base64
+import json
+import random
+import re
+import zlib
+import pytest
+from paper_parser import functions
+from paper_parser import parser
+
+WORDS = ['被告人', '索贿', '受贿', '贪污', '罪', '自首', '刑法（2015修正）', '第三百八十五条', '10万元', '，', '。', '贿']
+
+
+def random_sections(num, seed):
+    """ 随机的(row_id, 标签类型, 文本)，文本由常见词和单字拼成 """
+    rng = random.Random(seed)
+    return [(row_id, label, ''.join(rng.choice(WORDS) for i in range(rng.randint(0, 8))))
+            for row_id in range(1, num + 1) for label in (6, 7)]
+
+
+@pytest.fixture
+def index(tmp_path):
+    with functions.TextIndex(str(tmp_path / 'index.sqlite')) as index:
+        sections = random_sections(300, 1)
+        for row_id in range(1, 301):
+            values = dict(('s{}'.format(label), (label, text)) for i, label, text in sections if i == row_id)
+            index.save(row_id, 'd{}'.format(row_id), values, {'s6': 'v1', 's7': 'v1'}, True)
+        index.sections = sections
+        yield index
+
+
+def brute_force(sections, matches, labels=None):
+    return sorted(set(row_id for row_id, label, text in sections
+                      if (labels is None or label in labels) and matches(text)))
+
+
+@pytest.mark.parametrize('keyword, labels', [
+    ('索贿', None), ('索贿', [7]), ('贿', None), ('罪', [6]), ('刑法(2015修正)', None), ('被告人受贿', None),
+    ('不存在', None), ('', None),
+])
+def test_search_equals_brute_force(index, keyword, labels):
+    normalized = index.normalize(keyword)
+    assert index.search(keyword, labels) == brute_force(index.sections, lambda text: normalized in text, labels)
+
+
+@pytest.mark.parametrize('pattern, labels', [
+    (r'索贿.{0,6}罪', None), (r'(?:受贿|贪污)罪', [7]), (r'刑法（(\d{4})修正）第', None), (r'\d+万元', None),
+    (r'自首+', None), (r'(?i)索贿', None), (r'^被告人', [6]),
+])
+def test_search_regex_equals_brute_force(index, pattern, labels):
+    regex = re.compile(pattern)
+    assert index.search_regex(pattern, labels) == brute_force(index.sections, lambda text: regex.search(text), labels)
+
+
+@pytest.mark.parametrize('pattern, literals', [
+    (r'索取.{0,10}财物', ['索取', '财物']),
+    (r'(?:受贿|贪污)罪', ['罪']),
+    (r'(自首)+从轻', ['自首', '从轻']),
+    (r'(自首)?从轻', ['从轻']),
+    (r'(?i)abc', []),
+    (r'\d+', []),
+])
+def test_regex_literals(pattern, literals):
+    assert functions.TextIndex.regex_literals(re.compile(pattern)) == literals
+
+
+def test_replace_and_delete(index):
+    index.save(1, 'd1', {'s7': (7, '独有的词')}, {'s7': 'v2'}, False)  # 只替换版本有变化的部分
+    assert index.search('独有的词') == [1]
+    old_text = [text for row_id, label, text in index.sections if (row_id, label) == (1, 7)][0]
+    assert [row_id for row_id, label, text in index.texts({(1, 7)})] == [1]
+    assert list(index.texts({(1, 7)}))[0][2] == '独有的词' != old_text
+    index.delete_missing(0, None, range(2, 301))
+    assert index.search('独有的词') == []
+    assert index.db.execute('select count(*) from postings where id = 1').fetchone()[0] == 0
+    assert index.db.execute('select count(*) from sections where id = 1').fetchone()[0] == 0
+
+
+def test_postings_match_stored_texts(index):
+    index.save(5, 'changed', {'s6': (6, '新的文本'), 's7': (7, '')}, {'s6': 'v1', 's7': 'v1'}, True)
+    expected = set()
+    for row_id, label, text in index.texts(index.candidates([])):
+        expected |= set((gram, label, row_id) for gram in index.grams(text))
+    assert set(index.db.execute('select gram, label, id from postings')) == expected
+
+
+def paper_content(opinion):
+    paper = {
+        'firstinstance_text_basicinfo': '公诉机关指控被告人犯受贿罪',
+        'firstinstance_text_fact': '经审理查明，被告人收受财物。',
+        'firstinstance_text_opinion': opinion,
+        'firstinstance_text_judgement': '被告人犯受贿罪，判处有期徒刑三年。',
+    }
+    return functions.PaperContentCoder.encode(json.dumps(paper, ensure_ascii=False))
+
+
+def test_paper_text_index(fake_table, tmp_path):
+    index_path = str(tmp_path / 'index.sqlite')
+    fake_table.put(1, paper_content('本院认为，被告人索贿，依照刑法（2015修正）第三百八十五条'))
+    fake_table.put(2, paper_content('本院认为，被告人受贿'))
+    fake_table.put(3, base64.b64encode(zlib.compress(b'{not json')).decode())  # 解码失败
+    parser.paper_text_index(index_path, batch_size=2)
+    with functions.TextIndex(index_path) as index:
+        assert index.search('索贿', labels=[7]) == [1]
+        assert index.search('刑法（2015修正）') == [1]  # 括号内容保留
+        assert index.search('受贿罪', labels=[2, 8]) == [1, 2]
+        assert index.digests(0, None)[3][1] == 0
+
+    fake_table.put(2, paper_content('本院认为，被告人主动索要财物，系索贿'))
+    fake_table.delete(1)
+    parser.paper_text_index(index_path, batch_size=2)
+    with functions.TextIndex(index_path) as index:
+        row_ids = index.search('索贿', labels=[7])
+        assert row_ids == [2]
+    papers = list(parser.paper_generator(source=functions.MysqlSource(row_ids=row_ids), batch_size=1))
+    assert [paper.paper_id for paper in papers] == [2]